@@ -1,5 +1,6 @@
 from django.apps import AppConfig
 import os
+import sys
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -12,10 +13,14 @@ class ApiConfig(AppConfig):
         Initialize model and tokenizer when Django starts.
         Only load if models directory exists.
         """
+        # Startup checks (bundled NLTK data), see API/checks.py
+        from API import checks  # noqa: F401
+        # Management commands other than runserver never serve a request, skip the model
+        if os.path.basename(sys.argv[0]) == 'manage.py' and sys.argv[1:2] != ['runserver']:
+            return
         # Import dependencies here to avoid import errors when they're not installed
         try:
-            from transformers import BertTokenizer
-            import tensorflow as tf
+            from transformers import BertTokenizerFast
         except ImportError as e:
             print(f"⚠ Warning: Could not import ML dependencies: {e}")
             print("  Model and tokenizer will not be available.")
@@ -23,18 +28,21 @@ class ApiConfig(AppConfig):
             
         if ApiConfig.tokenizer is None:
             try:
-                ApiConfig.tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
+                # Fast (rust) tokenizer: sliding windows need its overflowing tokens
+                ApiConfig.tokenizer = BertTokenizerFast.from_pretrained("bert-base-uncased")
                 print("✓ Tokenizer loaded successfully")
             except Exception as e:
                 print(f"⚠ Warning: Could not load tokenizer: {e}")
                 
         if ApiConfig.model is None:
-            model_path = os.path.join(os.path.dirname(__file__), "models")
-            if os.path.exists(model_path):
-                try:
-                    ApiConfig.model = tf.keras.models.load_model(model_path)
-                    print("✓ Model loaded successfully")
-                except Exception as e:
-                    print(f"⚠ Warning: Could not load model: {e}")
-            else:
-                print(f"⚠ Warning: Model directory not found at {model_path}")
\ No newline at end of file
+            # MODEL_BACKEND picks the runtime: the keras SavedModel or a quantized export
+            from bert.API.backends import load_backend, MODEL_BACKEND
+            try:
+                ApiConfig.model = load_backend(MODEL_BACKEND)
+                print(f"✓ Model loaded successfully ({MODEL_BACKEND})")
+            except Exception as e:
+                print(f"⚠ Warning: Could not load {MODEL_BACKEND} model: {e}")
+            # Concurrent requests of this worker share batched model calls
+            from bert.API.inference import InferenceScheduler, INFERENCE_BATCHING
+            if INFERENCE_BATCHING and ApiConfig.model is not None and ApiConfig.tokenizer is not None:
+                ApiConfig.model = InferenceScheduler(ApiConfig.model, ApiConfig.tokenizer)
@@ -0,0 +1,17 @@
+from django.core.checks import Warning, register
+from bert.resources import missing_nltk_resources, nltk_hint, NLTK_DATA
+
+
+@register()
+def nltk_data_check(app_configs, **kwargs):
+    """
+    Warns at startup when the NLTK data was not bundled. Commands that never
+    preprocess (migrate, test, collectstatic) still run; the first request that
+    does fails with the same hint (bert/resources.py require_nltk) rather than
+    trying to download it.
+    """
+    missing = missing_nltk_resources()
+    if not missing:
+        return []
+    return [Warning(f"NLTK data {', '.join(missing)} not found in {NLTK_DATA}",
+                    hint=f"Bundle it with: {nltk_hint()}", id='API.W001')]
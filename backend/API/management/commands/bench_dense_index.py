@@ -0,0 +1,86 @@
+import glob
+import os
+import tempfile
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+
+def synthetic_vectors(n_rows, dim, n_topics=1000, spread=2.0, seed=0):
+    # Rows around random topic centres: only the latency of a given size means anything
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_topics, dim))
+    return centres[rng.integers(0, n_topics, n_rows)] + spread * rng.standard_normal((n_rows, dim))
+
+
+def largest_index(root):
+    # The index of the model version that has embedded the most articles
+    paths = [os.path.dirname(path) for path in glob.glob(os.path.join(root, '*', 'urls.txt'))]
+    return max(paths, key=lambda path: os.path.getsize(os.path.join(path, 'urls.txt')), default=None)
+
+
+def percentiles(seconds):
+    return f"{np.percentile(seconds, 50) * 1e3:>8.2f} {np.percentile(seconds, 95) * 1e3:>8.2f}"
+
+
+class Command(BaseCommand):
+    help = ('Recall@k and latency of the dense article index (IVF) against brute force, on the '
+            'embeddings of the articles scraped so far')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--index', help='an index directory, defaults to the largest one in DENSE_INDEX_DIR')
+        parser.add_argument('--synthetic', action='store_true',
+                            help='latency only, on --rows random vectors (their recall says nothing about embeddings)')
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--dim', type=int, default=768)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('-k', type=int, default=10)
+        parser.add_argument('--nprobe', nargs='+', type=int, default=[1, 2, 4, 8, 16, 32])
+
+    def handle(self, *args, **options):
+        from bert.API.dense_index import DenseIndex, DENSE_INDEX_DIR, normalize
+        k = options['k']
+        rng = np.random.default_rng(1)
+        if options['synthetic']:
+            index = DenseIndex(tempfile.mkdtemp(prefix='dense-bench-'), build_every=float('inf'))
+            vectors = synthetic_vectors(options['rows'] + options['queries'], options['dim'])
+            index.add([f"https://example.com/{i}" for i in range(options['rows'])], vectors[:options['rows']])
+            queries, held_out = normalize(vectors[options['rows']:]), [None] * options['queries']
+        else:
+            path = options['index'] or largest_index(DENSE_INDEX_DIR)
+            if path is None or not os.path.exists(os.path.join(path, 'urls.txt')):
+                raise CommandError(f"No dense index in {options['index'] or DENSE_INDEX_DIR}: serve some searches "
+                                   f"with a backend that can embed first, or pass --synthetic")
+            index = DenseIndex(path)
+            if len(index) <= k:
+                raise CommandError(f"{len(index)} articles embedded, too few for recall@{k}")
+            # Leave-one-out: indexed articles are the queries, each excluded from its own neighbours
+            held_out = rng.choice(len(index), min(options['queries'], len(index)), replace=False)
+            queries = np.asarray(index._vectors[held_out], dtype=np.float32)
+        start = time.perf_counter()
+        index.build(retrain=options['synthetic'])
+        self.stdout.write(f"{len(index)} rows ({'synthetic' if options['synthetic'] else index.root}), "
+                          f"{len(index._ivf['centroids'])} lists, built in {time.perf_counter() - start:.1f} s")
+        exact, brute = [], []
+        for query, row in zip(queries, held_out):
+            start = time.perf_counter()
+            scores = np.asarray(index._vectors, dtype=np.float32) @ query
+            if row is not None:
+                scores[row] = -np.inf
+            exact.append(set(np.argpartition(-scores, k - 1)[:k].tolist()))
+            brute.append(time.perf_counter() - start)
+        rows = {url: i for i, url in enumerate(index._urls)}
+        recall_column = '' if options['synthetic'] else f" {f'recall@{k}':>10}"
+        self.stdout.write(f"{'nprobe':>6}{recall_column} {'p50 ms':>8} {'p95 ms':>8}")
+        self.stdout.write(f"{'brute':>6}{'' if options['synthetic'] else f' {1:>10.3f}'} {percentiles(brute)}")
+        for nprobe in options['nprobe']:
+            recall, latency = [], []
+            for query, row, truth in zip(queries, held_out, exact):
+                start = time.perf_counter()
+                hits = index.search(query, k + 1, nprobe=nprobe)
+                latency.append(time.perf_counter() - start)
+                found = [rows[url] for url, _ in hits if rows[url] != row][:k]
+                recall.append(len(truth & set(found)) / k)
+            recall_value = '' if options['synthetic'] else f" {np.mean(recall):>10.3f}"
+            self.stdout.write(f"{nprobe:>6}{recall_value} {percentiles(latency)}")
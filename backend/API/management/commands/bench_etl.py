@@ -0,0 +1,46 @@
+import string
+import time
+import nltk
+from nltk.corpus import stopwords
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from API.management.commands.bench_parsers import load_corpus
+from bert.API.etl import Preprocessor
+from bert.parser.extract import paragraphs
+
+
+def legacy_preprocess(text):
+    # What etl(text).preprocess() did per call before the shared Preprocessor
+    en_stop = stopwords.words('english')
+    remove_punctuation_map = dict((ord(char), None) for char in string.punctuation)
+    new_text = nltk.word_tokenize(text.lower().translate(remove_punctuation_map))
+    return [word for word in new_text if word not in en_stop]
+
+
+class Command(BaseCommand):
+    requires_system_checks = []
+    help = "Per-token cost of the old per-call etl preprocessing against the shared Preprocessor."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', default=settings.ARTICLE_CACHE_DIR,
+                            help="Directory of .html files or an article store (default: ARTICLE_CACHE_DIR)")
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        texts = [paragraphs(html) for html in load_corpus(options['corpus'])]
+        texts = [text for text in texts if text.strip()]
+        if not texts:
+            raise CommandError(f"No saved pages found in {options['corpus']}")
+        preprocessor = Preprocessor()
+        tokens = sum(len(nltk.word_tokenize(text)) for text in texts)
+        self.stdout.write(f"{len(texts)} articles, {tokens} tokens, {options['repeat']} passes")
+        timings = {}
+        for name, run in (('legacy', lambda: [legacy_preprocess(text) for text in texts]),
+                          ('preprocess_many', lambda: preprocessor.preprocess_many(texts))):
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                out = run()
+            timings[name] = (time.perf_counter() - start) / options['repeat']
+            kept = sum(len(words) for words in out)
+            self.stdout.write(f"{name:<16}{timings[name] / tokens * 1e6:>8.2f} us/token{kept:>10} kept")
+        self.stdout.write(f"speed-up {timings['legacy'] / timings['preprocess_many']:.1f}x")
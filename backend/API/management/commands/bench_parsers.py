@@ -0,0 +1,73 @@
+import os
+import json
+import resource
+import time
+import zlib
+from multiprocessing import get_context
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def load_corpus(path):
+    # Saved pages: plain .html files or entries of the article store
+    pages = []
+    for dirpath, _, filenames in os.walk(path):
+        for name in sorted(filenames):
+            full = os.path.join(dirpath, name)
+            with open(full, 'rb') as fp:
+                raw = fp.read()
+            if name.endswith(('.html', '.htm')):
+                pages.append(raw.decode('utf-8', errors='replace'))
+            else:
+                try:
+                    pages.append(json.loads(zlib.decompress(raw))['html'])
+                except (ValueError, KeyError, zlib.error):
+                    continue
+    return pages
+
+
+def measure(backend, path, repeat):
+    # Runs in a fresh process so peak RSS belongs to this backend alone
+    from bert.parser.extract import paragraphs
+    pages = load_corpus(path)
+    paragraphs(pages[0], backend=backend)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    chars = 0
+    for _ in range(repeat):
+        for html in pages:
+            chars += len(paragraphs(html, backend=backend))
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    return elapsed, peak, chars // repeat
+
+
+class Command(BaseCommand):
+    requires_system_checks = []
+    help = "Compare paragraph extraction backends on a corpus of saved pages (time and peak memory)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', default=settings.ARTICLE_CACHE_DIR,
+                            help="Directory of .html files or an article store (default: ARTICLE_CACHE_DIR)")
+        parser.add_argument('--backends', default='lxml,selectolax,html5lib')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        pages = load_corpus(options['corpus'])
+        if not pages:
+            raise CommandError(f"No saved pages found in {options['corpus']}")
+        size = sum(len(html) for html in pages) / 1e6
+        self.stdout.write(f"{len(pages)} pages, {size:.1f} MB of html, {options['repeat']} passes")
+        self.stdout.write(f"{'backend':<12}{'ms/page':>10}{'MB/s':>10}{'peak MB':>10}{'chars':>12}")
+        ctx = get_context('spawn')
+        for backend in options['backends'].split(','):
+            with ctx.Pool(1) as pool:
+                try:
+                    elapsed, peak, chars = pool.apply(measure, (backend, options['corpus'], options['repeat']))
+                except ImportError as exc:
+                    self.stdout.write(f"{backend:<12}skipped: {exc}")
+                    continue
+            n = len(pages) * options['repeat']
+            # ru_maxrss is reported in KB on linux
+            self.stdout.write(f"{backend:<12}{elapsed / n * 1000:>10.2f}{size * options['repeat'] / elapsed:>10.1f}"
+                              f"{peak / 1024:>10.1f}{chars:>12}")
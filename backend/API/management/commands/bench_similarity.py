@@ -0,0 +1,52 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+
+
+def synthetic_docs(n_docs, doc_length, n_terms, seed=0):
+    # Zipf-distributed term ids, roughly the shape of preprocessed news text
+    rng = np.random.default_rng(seed)
+    return [(rng.zipf(1.3, doc_length) % n_terms + 1).astype(np.uint32) for _ in range(n_docs)]
+
+
+def legacy_scores(query, docs):
+    # The previous path: one TfidfVectorizer refit per (query, article) pair
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import linear_kernel
+    query = [str(i) for i in query]
+    scores = []
+    for doc in docs:
+        vectorizer = TfidfVectorizer(tokenizer=lambda i: i, lowercase=False, token_pattern=None)
+        tfidf = vectorizer.fit_transform([query, [str(i) for i in doc]])
+        scores.append(linear_kernel(tfidf[0:1], tfidf).flatten()[1])
+    return np.array(scores)
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class Command(BaseCommand):
+    help = 'Per-request similarity time: per-article vectorizer refits vs one TF-IDF fit'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10, 50, 100, 200, 500])
+        parser.add_argument('--doc-length', type=int, default=600)
+        parser.add_argument('--terms', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        from bert.API.similarity import similarities
+        query = synthetic_docs(1, 12, options['terms'], seed=1)[0]
+        self.stdout.write(f"{'articles':>8} {'refit ms':>10} {'one-shot ms':>12} {'speedup':>8}")
+        for size in options['sizes']:
+            docs = synthetic_docs(size, options['doc_length'], options['terms'])
+            legacy = timed(lambda: legacy_scores(query, docs), options['repeat'])
+            engine = timed(lambda: similarities(query, docs), options['repeat'])
+            self.stdout.write(f"{size:>8} {legacy * 1e3:>10.1f} {engine * 1e3:>12.1f} {legacy / engine:>7.1f}x")
@@ -0,0 +1,77 @@
+import os
+from collections import Counter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from bert.API.idf_model import IDF_MODEL_DIR, count_documents, doc_key, get_model, publish
+
+ETL_BATCH = 1000
+
+
+def store_documents():
+    # The article cache already holds preprocessed tokens, keyed by url
+    from bert.parser.article_store import article_store
+    for entry in article_store.entries():
+        if entry.get('tokens'):
+            yield entry['url'], entry['tokens']
+
+
+def text_documents(path):
+    # Plain .txt documents, e.g. bert/training/aclImdb/{train,test}/{pos,neg,unsup}
+    from bert.API.etl import etl
+    batch = []
+    for dirpath, _, filenames in os.walk(path):
+        for name in sorted(filenames):
+            if name.endswith('.txt'):
+                batch.append(os.path.relpath(os.path.join(dirpath, name), path))
+            if len(batch) == ETL_BATCH:
+                yield from _preprocessed(path, batch, etl)
+                batch = []
+    yield from _preprocessed(path, batch, etl)
+
+
+def _preprocessed(root, names, etl):
+    texts = []
+    for name in names:
+        with open(os.path.join(root, name), encoding='utf-8', errors='replace') as fp:
+            texts.append(fp.read())
+    yield from zip(names, etl.preprocess_many(texts))
+
+
+class Command(BaseCommand):
+    help = 'Builds or updates the background-corpus IDF model shared by the workers'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['store', 'text'], default='store',
+                            help='the article cache, or a directory of .txt documents')
+        parser.add_argument('--path', default=os.path.join(settings.BASE_DIR, 'bert/training/aclImdb'))
+        parser.add_argument('--rebuild', action='store_true', help='start over instead of adding to the current model')
+        parser.add_argument('--root', default=IDF_MODEL_DIR)
+
+    def handle(self, *args, **options):
+        model = None if options['rebuild'] else get_model(options['root'])
+        if model is not None:
+            counts, seen, n_docs = model.counts(), model.seen(), model.n_docs
+        else:
+            counts, seen, n_docs = Counter(), set(), 0
+        if options['source'] == 'store':
+            documents = store_documents()
+        elif os.path.isdir(options['path']):
+            documents = text_documents(options['path'])
+        else:
+            raise CommandError(f"{options['path']} is not a directory")
+        added = 0
+        for key, tokens in documents:
+            key = doc_key(key)
+            if key in seen:
+                continue
+            seen.add(key)
+            count_documents([tokens], counts)
+            added += 1
+        if not added and model is not None:
+            self.stdout.write(f"No new documents, {model.path} stays current")
+            return
+        os.makedirs(options['root'], exist_ok=True)
+        path = publish(counts, n_docs + added, seen, options['root'])
+        self.stdout.write(self.style.SUCCESS(f"{added} new documents, {n_docs + added} in total, "
+                                             f"{len(counts)} terms -> {path}"))
@@ -0,0 +1,14 @@
+import os
+from django.core.management.base import BaseCommand
+from bert.parser.article_index import article_index
+
+
+class Command(BaseCommand):
+    help = 'Applies the article index retention and compacts the SQLite FTS5 file (run from cron)'
+    requires_system_checks = []
+
+    def handle(self, *args, **options):
+        before = os.path.getsize(article_index.path) if os.path.exists(article_index.path) else 0
+        pruned = article_index.compact()
+        after = os.path.getsize(article_index.path)
+        self.stdout.write(self.style.SUCCESS(f"{pruned} articles pruned, {before / 2 ** 20:.1f} MiB -> {after / 2 ** 20:.1f} MiB"))
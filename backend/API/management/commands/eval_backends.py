@@ -0,0 +1,79 @@
+import os
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from bert.API.backends import BACKENDS
+
+
+def validation_split(path, seed=123, split=0.2):
+    """
+    The validation subset fine_tune.py trains against: the same file order,
+    shuffle and 80/20 cut as text_dataset_from_directory(..., seed=123).
+    """
+    paths, labels = [], []
+    for label, name in enumerate(('neg', 'pos')):
+        folder = os.path.join(path, name)
+        for filename in sorted(os.listdir(folder)):
+            if filename.endswith('.txt'):
+                paths.append(os.path.join(folder, filename))
+                labels.append(label)
+    np.random.RandomState(seed).shuffle(paths)
+    np.random.RandomState(seed).shuffle(labels)
+    cut = len(paths) - int(split * len(paths))
+    return paths[cut:], np.array(labels[cut:])
+
+
+class Uncached:
+    # No model_version: every text goes through the model, no sentiment cache hits
+    def __init__(self, backend):
+        self.backend = backend
+        self.tensor_type = backend.tensor_type
+
+    def __call__(self, features):
+        return self.backend(features)
+
+
+class Command(BaseCommand):
+    help = 'Accuracy vs latency of the model backends on the aclImdb validation split'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', default=os.path.join(settings.BASE_DIR, 'bert/training/aclImdb/train'))
+        parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+        parser.add_argument('--limit', type=int, default=1000, help='validation reviews to score')
+        parser.add_argument('--single', type=int, default=50, help='reviews timed one at a time')
+
+    def handle(self, *args, **options):
+        from transformers import BertTokenizerFast
+        from bert.API.tf_in_use import get_sents
+        if not os.path.isdir(os.path.join(options['data'], 'pos')):
+            raise CommandError(f"No aclImdb training data at {options['data']}")
+        paths, labels = validation_split(options['data'])
+        paths, labels = paths[:options['limit']], labels[:options['limit']]
+        texts = []
+        for path in paths:
+            with open(path, encoding='utf-8') as fp:
+                texts.append(fp.read())
+        tokenizer = BertTokenizerFast.from_pretrained("bert-base-uncased")
+        self.stdout.write(f"{len(texts)} reviews")
+        self.stdout.write(f"{'backend':>8} {'accuracy':>9} {'batched ms/text':>16} {'single p50 ms':>14} {'single p95 ms':>14}")
+        for name in options['backends']:
+            try:
+                model = Uncached(BACKENDS[name]())
+            except Exception as exc:
+                self.stdout.write(self.style.WARNING(f"{name:>8} not available: {exc}"))
+                continue
+            # Warm-up, the first call traces or allocates
+            get_sents(texts[:2], model, tokenizer)
+            start = time.perf_counter()
+            scores = np.array(get_sents(texts, model, tokenizer))
+            batched = (time.perf_counter() - start) / len(texts)
+            single = []
+            for text in texts[:options['single']]:
+                start = time.perf_counter()
+                get_sents([text], model, tokenizer)
+                single.append(time.perf_counter() - start)
+            accuracy = np.mean((scores > 0.5) == labels)
+            self.stdout.write(f"{name:>8} {accuracy:>9.4f} {batched * 1e3:>16.2f} "
+                              f"{np.percentile(single, 50) * 1e3:>14.2f} {np.percentile(single, 95) * 1e3:>14.2f}")
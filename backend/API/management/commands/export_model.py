@@ -0,0 +1,77 @@
+import os
+import tempfile
+from django.core.management.base import BaseCommand, CommandError
+from bert.API.backends import MODEL_EXPORT_DIR, MODEL_INPUTS, MODEL_PATH
+
+
+def serving_function(model):
+    # Dynamic batch and sequence length, int32 ids, a {'logits': ...} output like the SavedModel
+    # plus the mean-pooled encoder output for the dense article index
+    import tensorflow as tf
+    signature = [tf.TensorSpec([None, None], tf.int32, name=name) for name in MODEL_INPUTS]
+
+    @tf.function(input_signature=signature)
+    def serve(input_ids, attention_mask, token_type_ids):
+        inputs = {'input_ids': input_ids, 'attention_mask': attention_mask, 'token_type_ids': token_type_ids}
+        # TFBertForSequenceClassification is [encoder, dropout, classifier]: one encoder
+        # pass gives both outputs (dropout is a no-op at inference)
+        hidden, pooled = model.layers[0](inputs, training=False)[:2]
+        mask = tf.cast(attention_mask, hidden.dtype)[:, :, None]
+        embedding = tf.reduce_sum(hidden * mask, axis=1) / tf.maximum(tf.reduce_sum(mask, axis=1), 1.0)
+        return {'logits': model.layers[-1](pooled), 'embedding': embedding}
+    return serve, signature
+
+
+def export_tflite(model, output, quantize):
+    import tensorflow as tf
+    serve, _ = serving_function(model)
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([serve.get_concrete_function()], model)
+    if quantize:
+        # Dynamic range quantization: int8 weights, float activations, no calibration data
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(output, 'wb') as fp:
+        fp.write(converter.convert())
+
+
+def export_onnx(model, output, quantize):
+    try:
+        import tf2onnx
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+    except ImportError as exc:
+        raise CommandError(f"ONNX export needs tf2onnx and onnxruntime: {exc}")
+    serve, signature = serving_function(model)
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32 = os.path.join(tmp, 'model.onnx') if quantize else output
+        tf2onnx.convert.from_function(serve, input_signature=signature, opset=13, output_path=fp32)
+        if quantize:
+            quantize_dynamic(fp32, output, weight_type=QuantType.QInt8)
+
+
+EXPORTERS = {
+    'tflite': export_tflite,
+    'onnx': export_onnx,
+}
+
+
+class Command(BaseCommand):
+    help = 'Exports the fine-tuned classifier to a CPU runtime (MODEL_BACKEND=tflite|onnx)'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORTERS), default='tflite')
+        parser.add_argument('--model', default=MODEL_PATH, help='the keras SavedModel directory')
+        parser.add_argument('--output', help=f"defaults to {MODEL_EXPORT_DIR}/model.<format>")
+        parser.add_argument('--no-quantize', action='store_true', help='keep float32 weights')
+
+    def handle(self, *args, **options):
+        import tensorflow as tf
+        if not os.path.isdir(options['model']):
+            raise CommandError(f"No SavedModel at {options['model']}")
+        output = options['output'] or os.path.join(MODEL_EXPORT_DIR, f"model.{options['format']}")
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        model = tf.keras.models.load_model(options['model'])
+        # Written next to the target and moved, so a serving worker never loads half a file
+        tmp = f"{output}.tmp"
+        EXPORTERS[options['format']](model, tmp, not options['no_quantize'])
+        os.replace(tmp, output)
+        self.stdout.write(self.style.SUCCESS(f"{output} ({os.path.getsize(output) / 2 ** 20:.1f} MiB)"))
@@ -0,0 +1,59 @@
+import os
+import re
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from bert.resources import HEAVY_MODULES, NLTK_DATA, NLTK_RESOURCES, missing_nltk_resources
+
+# -X importtime stderr: "import time: self [us] | cumulative | imported package"
+IMPORTTIME = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def import_times(targets):
+    # A fresh interpreter, so nothing is already in sys.modules
+    code = 'import django; django.setup()\n' + ''.join(f'import {target}\n' for target in targets)
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'factualweb.settings.dev'))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=settings.BASE_DIR,
+                          env=env, capture_output=True, text=True)
+    times = []
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            times.append((name, int(own), int(cumulative), len(indent) // 2))
+    return proc.returncode, proc.stderr, times
+
+
+class Command(BaseCommand):
+    help = 'Lists what a worker imports at startup and what each import costs'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--targets', nargs='+', default=['API.urls'],
+                            help='modules a worker imports before its first request')
+        parser.add_argument('--top', type=int, default=25)
+
+    def handle(self, *args, **options):
+        code, stderr, times = import_times(options['targets'])
+        if code != 0:
+            raise CommandError(stderr.strip().splitlines()[-1] if stderr.strip() else 'import failed')
+        total = sum(own for _, own, _, _ in times)
+        self.stdout.write(f"{len(times)} modules, {total / 1e6:.2f} s importing {' '.join(options['targets'])}")
+        self.stdout.write(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        # Top level packages only, their cumulative time covers the submodules
+        top_level = [t for t in times if '.' not in t[0]]
+        for name, own, cumulative, _ in sorted(top_level, key=lambda t: t[2], reverse=True)[:options['top']]:
+            self.stdout.write(f"{cumulative / 1e3:>14.1f} {own / 1e3:>9.1f}  {name}")
+        loaded = {name for name, _, _, _ in times}
+        eager = [name for name in HEAVY_MODULES if name in loaded]
+        if eager:
+            # tensorflow/transformers are expected here only from ApiConfig's model preload
+            self.stdout.write(self.style.WARNING(f"heavy modules imported at startup: {', '.join(eager)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"none of {', '.join(HEAVY_MODULES)} imported at startup"))
+        missing = missing_nltk_resources()
+        if missing:
+            self.stdout.write(self.style.ERROR(f"NLTK data missing from {NLTK_DATA}: {', '.join(missing)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"NLTK data {', '.join(NLTK_RESOURCES)} found"))
@@ -0,0 +1,96 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from django.test import SimpleTestCase
+from bert.parser.extract import StreamingArticle, EMPTY_METADATA
+from bert.parser.fetcher import fetch_all
+from bert.parser import politeness
+
+ARTICLE = b'<html><head><title>Wire story</title></head><body><p>Rates were left unchanged.</p></body></html>'
+
+
+class Handler(BaseHTTPRequestHandler):
+    requested = []
+
+    def do_GET(self):
+        self.requested.append(self.path)
+        if self.path == '/robots.txt':
+            self.reply(200, b'User-agent: *\nDisallow: /private\n', {'Content-Type': 'text/plain'})
+        elif self.path == '/article':
+            self.reply(200, ARTICLE, {'Content-Type': 'text/html; charset=utf-8'})
+        elif self.path == '/not-modified':
+            # Revalidation of a stored article: validators match, no body
+            self.reply(304, b'', {'ETag': '"v1"'})
+        elif self.path == '/moved':
+            self.reply(301, b'', {'Location': '/article', 'Content-Type': 'text/html'})
+        elif self.path == '/no-content':
+            self.reply(204, b'', {})
+        elif self.path == '/empty':
+            self.reply(200, b'', {'Content-Type': 'text/html'})
+        else:
+            self.reply(404, b'<html><body><p>Page not found</p></body></html>', {'Content-Type': 'text/html'})
+
+    def reply(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status not in (204, 304):
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FetcherTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        Handler.requested.clear()
+        with politeness._robots_lock:
+            politeness._robots.clear()
+
+    def fetch(self, *paths):
+        with mock.patch('bert.parser.fetcher.load_cookies', return_value=[]):
+            return fetch_all([self.base + path for path in paths])
+
+    def test_bodiless_responses_do_not_fail_the_batch(self):
+        pages = self.fetch('/article', '/not-modified', '/moved', '/no-content', '/empty')
+        self.assertEqual([page.status for page in pages], [200, 304, 301, 204, 200])
+        self.assertEqual(pages[0].article[0].strip(), 'Rates were left unchanged.')
+        self.assertEqual(pages[0].article[1].title, 'Wire story')
+        for page in pages[1:]:
+            self.assertEqual(page.article, ('', EMPTY_METADATA))
+
+    def test_redirect_is_not_followed(self):
+        page, = self.fetch('/moved')
+        self.assertEqual(page.headers['Location'], '/article')
+
+    def test_error_page_is_not_an_article(self):
+        page, = self.fetch('/missing')
+        self.assertEqual((page.status, page.text, page.article), (404, '', ('', EMPTY_METADATA)))
+
+    def test_robots_txt_is_loaded_once_per_host(self):
+        pages = self.fetch('/article', '/private/draft', '/article')
+        self.assertEqual([page.status for page in pages], [200, None, 200])
+        self.assertEqual([page.disallowed for page in pages], [False, True, False])
+        self.assertEqual(Handler.requested.count('/robots.txt'), 1)
+        self.assertNotIn('/private/draft', Handler.requested)
+
+    def test_streaming_article_without_body(self):
+        self.assertEqual(StreamingArticle().close(), ('', EMPTY_METADATA))
+        stream = StreamingArticle()
+        stream.feed(b'   ')
+        self.assertEqual(stream.close(), ('', EMPTY_METADATA))
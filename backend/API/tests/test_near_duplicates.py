@@ -0,0 +1,28 @@
+import numpy as np
+from django.test import SimpleTestCase
+from bert.API.near_duplicates import clusters, simhash, SIMHASH_MAX_DISTANCE
+
+# Token id arrays: an article, a syndicated copy with its last token changed, and an unrelated one
+ARTICLE = np.arange(100, 300, dtype=np.uint32)
+COPY = np.concatenate([ARTICLE[:-1], np.array([999], dtype=np.uint32)])
+UNRELATED = np.arange(5000, 5200, dtype=np.uint32)
+
+
+def distance(a, b):
+    return bin(simhash(a) ^ simhash(b)).count('1')
+
+
+class NearDuplicateTests(SimpleTestCase):
+    def test_copy_is_within_the_distance_and_unrelated_is_not(self):
+        self.assertLessEqual(distance(ARTICLE, COPY), SIMHASH_MAX_DISTANCE)
+        self.assertGreater(distance(ARTICLE, UNRELATED), SIMHASH_MAX_DISTANCE)
+
+    def test_copy_joins_the_earlier_article(self):
+        self.assertEqual(clusters([ARTICLE, UNRELATED, COPY, ARTICLE[:5]]), [[0, 2], [1], [3]])
+
+    def test_empty_article_stays_alone(self):
+        self.assertEqual(clusters([ARTICLE, UNRELATED, COPY, []]), [[0, 2], [1], [3]])
+        self.assertEqual(clusters([[], []]), [[0], [1]])
+
+    def test_representative_is_the_first_copy(self):
+        self.assertEqual(clusters([UNRELATED, COPY, ARTICLE]), [[0], [1, 2]])
@@ -0,0 +1,50 @@
+import numpy as np
+from django.test import SimpleTestCase
+from bert.API.passages import bm25, split, top_passages
+
+
+def ids(*values):
+    return np.array(values, dtype=np.uint32)
+
+
+class Bm25Tests(SimpleTestCase):
+    def test_more_matches_rank_higher(self):
+        passages = [ids(1, 2, 3, 4), ids(1, 1, 5, 6), ids(7, 8, 9, 10)]
+        scores = bm25(ids(1), passages)
+        self.assertEqual(list(np.argsort(-scores)), [1, 0, 2])
+        self.assertEqual(scores[2], 0)
+
+    def test_rare_term_outweighs_common_term(self):
+        passages = [ids(1, 5, 6), ids(2, 5, 6), ids(2, 7, 8), ids(2, 9, 10)]
+        scores = bm25(ids(1, 2), passages)
+        self.assertEqual(int(np.argmax(scores)), 0)
+
+    def test_no_query_term_scores_zero(self):
+        self.assertEqual(list(bm25(ids(42), [ids(1, 2), ids(3, 4)])), [0, 0])
+
+
+class TopPassagesTests(SimpleTestCase):
+    # 200 tokens: passages of 64 start at 0, 48, 96 and 136
+    DOC = np.arange(1000, 1200, dtype=np.uint32)
+
+    def test_split_reaches_the_end(self):
+        self.assertEqual(split(self.DOC), [0, 48, 96, 136])
+        self.assertEqual(split(self.DOC[:64]), [0])
+
+    def test_best_passage_is_kept(self):
+        out, = top_passages(ids(1190), [self.DOC], k=1)
+        self.assertEqual(list(out), list(self.DOC[136:]))
+
+    def test_overlapping_winners_are_merged_in_reading_order(self):
+        out, = top_passages(ids(1100), [self.DOC], k=2)
+        self.assertEqual(list(out), list(self.DOC[48:160]))
+
+    def test_lede_is_kept_without_a_query_term(self):
+        out, = top_passages(ids(42), [self.DOC], k=1)
+        self.assertEqual(list(out), list(self.DOC[:64]))
+
+    def test_short_docs_and_k_zero_are_untouched(self):
+        short = self.DOC[:100]
+        out, = top_passages(ids(42), [short], k=2)
+        self.assertIs(out, short)
+        self.assertIs(top_passages(ids(42), [self.DOC], k=0)[0], self.DOC)
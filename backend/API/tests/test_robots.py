@@ -0,0 +1,36 @@
+from django.test import SimpleTestCase
+from bert.parser.politeness import RobotsRules
+
+
+class RobotsRulesTests(SimpleTestCase):
+    def parse(self, text, agent='factual'):
+        return RobotsRules.parse(text, agent=agent)
+
+    def test_longest_match_wins(self):
+        rules = self.parse('User-agent: *\nDisallow: /news\nAllow: /news/public\n')
+        self.assertFalse(rules.allowed('/news/private'))
+        self.assertTrue(rules.allowed('/news/public/story'))
+        self.assertTrue(rules.allowed('/about'))
+
+    def test_allow_wins_ties(self):
+        rules = self.parse('User-agent: *\nDisallow: /page\nAllow: /page\n')
+        self.assertTrue(rules.allowed('/page'))
+
+    def test_wildcards(self):
+        rules = self.parse('User-agent: *\nDisallow: /*.pdf$\nDisallow: /search*q=\n')
+        self.assertFalse(rules.allowed('/files/report.pdf'))
+        self.assertTrue(rules.allowed('/files/report.pdf?download=1'))
+        self.assertFalse(rules.allowed('/search?lang=en&q=rates'))
+        self.assertTrue(rules.allowed('/search?lang=en'))
+
+    def test_empty_disallow_allows_everything(self):
+        self.assertTrue(self.parse('User-agent: *\nDisallow:\n').allowed('/anything'))
+
+    def test_named_group_replaces_the_wildcard_group(self):
+        text = ('User-agent: *\nDisallow: /\n\n'
+                'User-agent: otherbot\nUser-agent: Factual\nDisallow: /private\nCrawl-delay: 2\n')
+        rules = self.parse(text)
+        self.assertTrue(rules.allowed('/news'))
+        self.assertFalse(rules.allowed('/private/draft'))
+        self.assertEqual(rules.crawl_delay, 2)
+        self.assertFalse(self.parse(text, agent='somebot').allowed('/news'))
@@ -0,0 +1,117 @@
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+from django.test import SimpleTestCase
+from bert.parser.search import (FallbackSearchProvider, HttpSearchProvider, SearchBlocked,
+                                SeleniumSearchProvider, parse_links)
+
+RENDERED = '''<html><body>
+<div class="g"><div class="yuRUbf"><a href="https://news.example.com/rates">Rates</a></div></div>
+<div class="g"><div class="yuRUbf"><a href="https://wire.example.org/rates-copy">Copy</a></div></div>
+<div class="g"><div class="yuRUbf"><a href="https://www.google.com/preferences">Settings</a></div></div>
+</body></html>'''
+PLAIN = '''<html><body>
+<a href="/url?q=https://news.example.com/rates&amp;sa=U">Rates</a>
+<a href="/url?q=https://news.example.com/rates&amp;sa=U">Rates again</a>
+<a href="/search?q=next">Next page</a>
+</body></html>'''
+CHALLENGE = '<html><body><form id="captcha-form">Our systems have detected unusual traffic</form></body></html>'
+
+
+class Handler(BaseHTTPRequestHandler):
+    # The stand-in search engine: the query picks the kind of answer
+    requests = []
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        self.requests.append(query)
+        q = query.get('q', [''])[0]
+        if 'throttled' in q:
+            self.reply(429, 'Too Many Requests')
+        elif 'challenge' in q:
+            self.reply(200, CHALLENGE)
+        elif 'empty' in q:
+            self.reply(200, '<html><body>No results</body></html>')
+        else:
+            self.reply(200, PLAIN)
+
+    def reply(self, status, body):
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeDriverPool():
+    """Stands in for the headless chrome pool: every page renders the results markup."""
+    def __init__(self):
+        self.urls = []
+
+    @contextmanager
+    def driver(self):
+        pool = self
+
+        class Driver():
+            page_source = RENDERED
+
+            def get(self, url):
+                pool.urls.append(url)
+        yield Driver()
+
+
+class SearchProviderTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}/search"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        Handler.requests.clear()
+        self.pool = FakeDriverPool()
+        patcher = mock.patch('bert.parser.search.get_pool', return_value=self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def provider(self):
+        return FallbackSearchProvider(HttpSearchProvider(base_url=self.base), SeleniumSearchProvider(base_url=self.base))
+
+    def test_parse_links(self):
+        self.assertEqual(parse_links(RENDERED), ['https://news.example.com/rates', 'https://wire.example.org/rates-copy'])
+        self.assertEqual(parse_links(PLAIN), ['https://news.example.com/rates'])
+
+    def test_http_provider(self):
+        links = HttpSearchProvider(base_url=self.base).search('interest rates', 1)
+        self.assertEqual(links, ['https://news.example.com/rates'])
+        self.assertEqual(Handler.requests, [{'q': ['interest rates'], 'start': ['10']}])
+
+    def test_http_provider_raises_on_blocked_responses(self):
+        for query in ('throttled', 'challenge'):
+            with self.assertRaises(SearchBlocked):
+                HttpSearchProvider(base_url=self.base).search(query, 0)
+
+    def test_results_come_from_http_without_selenium(self):
+        self.assertEqual(self.provider().search('interest rates', 0), ['https://news.example.com/rates'])
+        self.assertEqual(self.pool.urls, [])
+
+    def test_blocked_search_falls_back_to_selenium(self):
+        for query in ('throttled', 'challenge', 'empty'):
+            with self.subTest(query=query):
+                self.pool.urls.clear()
+                links = self.provider().search(query, 0)
+                self.assertEqual(links, ['https://news.example.com/rates', 'https://wire.example.org/rates-copy'])
+                self.assertEqual(self.pool.urls, [f"{self.base}?q={query}&start=0"])
@@ -1,5 +1,5 @@
 from django.urls import path
-from API.views import SearchView, FactualProxyView, AnalyzeAndMatchView
+from API.views import SearchView, FactualProxyView, AnalyzeAndMatchView, MetricsView
 
 
 urlpatterns = [
@@ -9,4 +9,6 @@ urlpatterns = [
     path('factual/<str:endpoint>/', FactualProxyView.as_view(), name="factual_proxy"),
     # High-level endpoint with external model integration
     path('analyze-and-match/', AnalyzeAndMatchView.as_view(), name="analyze_and_match"),
+    # Pipeline cache and timing counters of the answering worker
+    path('metrics/', MetricsView.as_view(), name="metrics"),
 ]
\ No newline at end of file
@@ -7,6 +7,7 @@ from rest_framework import status
 from bert.API.etl import etl
 from bert.API.tf_in_use import prod
 from API.apps import ApiConfig
+from bert.metrics import snapshot
 
 
 class SearchView(APIView):
@@ -166,4 +167,10 @@ class AnalyzeAndMatchView(APIView):
             )
 
 
-    
\ No newline at end of file
+class MetricsView(APIView):
+    """
+    Counters of the search/article pipeline for this worker process.
+    Endpoint: /api/metrics/
+    """
+    def get(self, request):
+        return Response(snapshot(), status=status.HTTP_200_OK)
@@ -0,0 +1,90 @@
+import os
+import threading
+import numpy as np
+from django.conf import settings
+from bert.resources import lazy_import
+from bert.API.sentiment_cache import fingerprint
+from bert.API.inference import MODEL_INPUTS
+
+# 'keras' (the SavedModel as trained), 'tflite' or 'onnx' (exported by manage.py export_model)
+MODEL_BACKEND = getattr(settings, 'MODEL_BACKEND', 'keras')
+MODEL_PATH = getattr(settings, 'MODEL_PATH', os.path.join(settings.BASE_DIR, 'API/models'))
+MODEL_EXPORT_DIR = getattr(settings, 'MODEL_EXPORT_DIR', os.path.join(settings.BASE_DIR, 'API/models_optimized'))
+# Intra-op threads of the tflite/onnx runtimes, per gunicorn worker
+MODEL_THREADS = getattr(settings, 'MODEL_THREADS', 1)
+
+# Every backend takes the padded tokenizer output and returns {'logits': ndarray},
+# tensor_type is what tokenizer.pad() should return for it. Backends with
+# can_embed also give the mean-pooled encoder output (bert/API/dense_index.py)
+
+def mean_pool(hidden, mask):
+  """Mean of the token vectors under the attention mask, one row per input."""
+  mask = np.asarray(mask, dtype=np.float32)[..., None]
+  return (np.asarray(hidden, dtype=np.float32) * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1)
+
+class KerasBackend:
+  tensor_type = 'tf'
+  def __init__(self, path=MODEL_PATH):
+    tf = lazy_import('tensorflow')
+    self.model = tf.keras.models.load_model(path)
+    # Part of every sentiment cache key, a retrained model never reuses old scores
+    self.model_version = f"keras:{fingerprint(path)}"
+    # The classifier's first layer is the BERT encoder (TFBertMainLayer)
+    self.can_embed = bool(self.model.layers)
+  def __call__(self, features):
+    return {'logits': np.asarray(self.model(features)["logits"])}
+  def embed(self, features):
+    hidden = self.model.layers[0](dict(features), training=False)[0]
+    return mean_pool(hidden, features['attention_mask'])
+
+class TFLiteBackend:
+  tensor_type = 'np'
+  def __init__(self, path=os.path.join(MODEL_EXPORT_DIR, 'model.tflite')):
+    try:
+      # The standalone runtime is enough to serve, tensorflow only to export
+      Interpreter = lazy_import('tflite_runtime.interpreter').Interpreter
+    except ImportError:
+      Interpreter = lazy_import('tensorflow').lite.Interpreter
+    self.interpreter = Interpreter(model_path=path, num_threads=MODEL_THREADS)
+    self.runner = self.interpreter.get_signature_runner()
+    self.inputs = list(self.runner.get_input_details())
+    self.model_version = f"tflite:{fingerprint(path)}"
+    # Exports made before the embedding output only score
+    self.can_embed = 'embedding' in self.runner.get_output_details()
+    # One interpreter per worker, it is not thread-safe
+    self._lock = threading.Lock()
+  def __call__(self, features):
+    inputs = {name: np.asarray(features[name], dtype=np.int32) for name in self.inputs}
+    with self._lock:
+      return {'logits': self.runner(**inputs)['logits']}
+  def embed(self, features):
+    inputs = {name: np.asarray(features[name], dtype=np.int32) for name in self.inputs}
+    with self._lock:
+      return self.runner(**inputs)['embedding']
+
+class OnnxBackend:
+  tensor_type = 'np'
+  def __init__(self, path=os.path.join(MODEL_EXPORT_DIR, 'model.onnx')):
+    ort = lazy_import('onnxruntime')
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = MODEL_THREADS
+    self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+    self.inputs = {i.name: np.int64 if i.type == 'tensor(int64)' else np.int32 for i in self.session.get_inputs()}
+    self.model_version = f"onnx:{fingerprint(path)}"
+    self.can_embed = 'embedding' in {o.name for o in self.session.get_outputs()}
+  def __call__(self, features):
+    inputs = {name: np.asarray(features[name], dtype=dtype) for name, dtype in self.inputs.items()}
+    # InferenceSession.run is thread-safe
+    return {'logits': self.session.run(['logits'], inputs)[0]}
+  def embed(self, features):
+    inputs = {name: np.asarray(features[name], dtype=dtype) for name, dtype in self.inputs.items()}
+    return self.session.run(['embedding'], inputs)[0]
+
+BACKENDS = {
+  'keras': KerasBackend,
+  'tflite': TFLiteBackend,
+  'onnx': OnnxBackend,
+}
+
+def load_backend(name=MODEL_BACKEND):
+  return BACKENDS[name]()
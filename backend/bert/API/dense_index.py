@@ -0,0 +1,284 @@
+import fcntl
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from bert.metrics import get_metrics
+from bert.API.inference import MODEL_INPUTS, SENTIMENT_MAX_LENGTH, run_embeddings
+
+DENSE_INDEX_DIR = getattr(settings, 'DENSE_INDEX_DIR', os.path.join(settings.BASE_DIR, '.cache/dense'))
+# 'off', or 'merge': the nearest known articles join the candidates of a query. Only urls
+# are stored here, hits are read from the article index and need ARTICLE_INDEX_MODE on
+DENSE_INDEX_MODE = getattr(settings, 'DENSE_INDEX_MODE', 'merge')
+DENSE_INDEX_TOP_K = getattr(settings, 'DENSE_INDEX_TOP_K', 10)
+# Inverted lists scanned per query, more is slower and closer to brute force
+DENSE_INDEX_NPROBE = getattr(settings, 'DENSE_INDEX_NPROBE', 8)
+# Rows appended since the last build that start a background build
+DENSE_INDEX_BUILD_EVERY = getattr(settings, 'DENSE_INDEX_BUILD_EVERY', 256)
+# Articles waiting for an embedding, past this new ones are dropped (the next scrape retries)
+DENSE_INDEX_MAX_PENDING = getattr(settings, 'DENSE_INDEX_MAX_PENDING', 512)
+# k-means: iterations, and training rows per list
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 256
+
+def embed_texts(model, tokenizer, words):
+  """Normalized embedding of the first SENTIMENT_MAX_LENGTH tokens of every word list."""
+  encoded = tokenizer(words, is_split_into_words=True, max_length=SENTIMENT_MAX_LENGTH, truncation=True)
+  keys = [key for key in MODEL_INPUTS if key in encoded]
+  return run_embeddings(model, tokenizer, [{key: encoded[key][i] for key in keys} for i in range(len(words))])
+
+def normalize(vectors):
+  vectors = np.asarray(vectors, dtype=np.float32)
+  return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+def assign(vectors, centroids, chunk=8192):
+  """Nearest (cosine) centroid of every row, in chunks so float16 rows are widened a few at a time."""
+  labels = np.empty(len(vectors), dtype=np.int32)
+  for start in range(0, len(vectors), chunk):
+    labels[start:start + chunk] = np.argmax(np.asarray(vectors[start:start + chunk], dtype=np.float32) @ centroids.T, axis=1)
+  return labels
+
+def kmeans(vectors, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+  """Spherical k-means centroids (n_lists, dim) of normalized rows."""
+  random = np.random.RandomState(seed)
+  sample = np.asarray(vectors[np.sort(random.choice(len(vectors), min(len(vectors), n_lists * KMEANS_SAMPLE_PER_LIST), replace=False))], dtype=np.float32)
+  centroids = sample[random.choice(len(sample), n_lists, replace=False)]
+  for _ in range(iterations):
+    labels = assign(sample, centroids)
+    members = sparse.csr_matrix((np.ones(len(sample), dtype=np.float32), (labels, np.arange(len(sample)))),
+                                shape=(n_lists, len(sample)))
+    sums = np.asarray(members @ sample)
+    sizes = np.bincount(labels, minlength=n_lists)
+    # An empty list restarts from a random row
+    empty = sizes == 0
+    sums[empty] = sample[random.choice(len(sample), int(empty.sum()))]
+    centroids = normalize(sums)
+  return centroids
+
+class DenseIndex:
+  """
+  Nearest-neighbour index of article embeddings, shared by the workers on the
+  node. Vectors are appended (normalized float16) to vectors.f16 and their
+  urls to urls.txt under a file lock, and read through a memmap. An IVF
+  structure (k-means centroids, one inverted list per centroid) in ivf.npz
+  narrows a query to the rows of its nprobe nearest lists; rows appended since
+  the last build are scanned directly. Builds run in a background thread:
+  new rows are assigned to the existing lists, and the centroids are
+  retrained once the index has doubled since they were.
+  """
+  def __init__(self, root, nprobe=DENSE_INDEX_NPROBE, build_every=DENSE_INDEX_BUILD_EVERY):
+    self.root = root
+    self.nprobe = nprobe
+    self.build_every = build_every
+    self.metrics = get_metrics('dense_index')
+    self._urls = []
+    self._known = set()
+    self._urls_offset = 0
+    self._dim = None
+    self._vectors = None
+    self._ivf = None
+    self._ivf_mtime = None
+    self._lock = threading.RLock()
+    self._builder = None
+    self._executor = None
+    self._pid = None
+    self._pending = 0
+
+  def _path(self, name):
+    return os.path.join(self.root, name)
+
+  def _flock(self, name, blocking=True):
+    os.makedirs(self.root, exist_ok=True)
+    fp = open(self._path(name), 'a')
+    try:
+      fcntl.flock(fp, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+      fp.close()
+      return None
+    return fp
+
+  def _refresh(self):
+    # Picks up rows other workers appended and a newer IVF build
+    with self._lock:
+      try:
+        with open(self._path('urls.txt'), 'rb') as fp:
+          fp.seek(self._urls_offset)
+          data = fp.read()
+      except FileNotFoundError:
+        return
+      # Only whole lines, a writer may be half way through one
+      data = data[:data.rfind(b'\n') + 1]
+      if data:
+        self._urls_offset += len(data)
+        urls = data.decode('utf-8').splitlines()
+        self._urls.extend(urls)
+        self._known.update(urls)
+      if self._dim is None:
+        with open(self._path('meta.json')) as fp:
+          self._dim = json.load(fp)['dim']
+      rows = min(len(self._urls), os.path.getsize(self._path('vectors.f16')) // (2 * self._dim))
+      if self._vectors is None or len(self._vectors) != rows:
+        self._vectors = np.memmap(self._path('vectors.f16'), dtype=np.float16, mode='r', shape=(rows, self._dim)) if rows else None
+      try:
+        mtime = os.stat(self._path('ivf.npz')).st_mtime_ns
+      except FileNotFoundError:
+        return
+      if mtime != self._ivf_mtime:
+        with np.load(self._path('ivf.npz')) as ivf:
+          labels = ivf['labels']
+          order = np.argsort(labels, kind='stable').astype(np.int32)
+          offsets = np.searchsorted(labels[order], np.arange(len(ivf['centroids']) + 1))
+          self._ivf = {'centroids': ivf['centroids'], 'labels': labels, 'order': order,
+                       'offsets': offsets, 'trained_on': int(ivf['trained_on'])}
+        self._ivf_mtime = mtime
+
+  def __len__(self):
+    self._refresh()
+    return 0 if self._vectors is None else len(self._vectors)
+
+  def __contains__(self, url):
+    return url in self._known
+
+  def add(self, urls, vectors):
+    """Appends the (url, embedding) pairs not indexed yet."""
+    vectors = normalize(vectors).astype(np.float16)
+    lock = self._flock('lock')
+    try:
+      self._refresh()
+      keep = sorted({url: i for i, url in enumerate(urls) if url not in self._known and '\n' not in url}.values())
+      if not keep:
+        return 0
+      if self._dim is None:
+        with open(self._path('meta.json'), 'w') as fp:
+          json.dump({'dim': int(vectors.shape[1])}, fp)
+      # Vectors before urls: a row only counts once its url line is complete
+      with open(self._path('vectors.f16'), 'ab') as fp:
+        fp.write(vectors[keep].tobytes())
+      with open(self._path('urls.txt'), 'ab') as fp:
+        fp.write(''.join(f"{urls[i]}\n" for i in keep).encode('utf-8'))
+      self._refresh()
+    finally:
+      lock.close()
+    self.metrics.incr('added', len(keep))
+    self.maybe_build()
+    return len(keep)
+
+  def add_later(self, model, tokenizer, urls, docs):
+    """Embeds and adds the new articles (word lists) in a background thread."""
+    todo = [(url, doc) for url, doc in zip(urls, docs) if url not in self._known and len(doc)]
+    if not todo:
+      return
+    with self._lock:
+      # Threads do not survive a fork, one executor per gunicorn worker
+      if self._executor is None or self._pid != os.getpid():
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dense-index')
+        self._pid = os.getpid()
+        self._pending = 0
+      if self._pending + len(todo) > DENSE_INDEX_MAX_PENDING:
+        self.metrics.incr('dropped', len(todo))
+        return
+      self._pending += len(todo)
+    self._executor.submit(self._embed_and_add, model, tokenizer, todo)
+
+  def _embed_and_add(self, model, tokenizer, todo):
+    try:
+      start = time.perf_counter()
+      vectors = embed_texts(model, tokenizer, [list(doc) for _, doc in todo])
+      self.metrics.observe('embed_seconds', time.perf_counter() - start)
+      self.add([url for url, _ in todo], vectors)
+    except Exception as exc:
+      # The index is an accelerator, it never fails a request
+      print(f"Could not add {len(todo)} articles to the dense index: {exc}")
+    finally:
+      with self._lock:
+        self._pending -= len(todo)
+
+  def search(self, vector, k=DENSE_INDEX_TOP_K, nprobe=None):
+    """[(url, cosine similarity)] of the k nearest indexed articles."""
+    start = time.perf_counter()
+    self._refresh()
+    vectors, ivf = self._vectors, self._ivf
+    if vectors is None:
+      return []
+    query = normalize(vector)
+    if ivf is None:
+      candidates = np.arange(len(vectors))
+    else:
+      # Rows of the nprobe nearest lists, and the ones appended since the build
+      nprobe = min(nprobe or self.nprobe, len(ivf['centroids']))
+      lists = np.argpartition(-(ivf['centroids'] @ query), nprobe - 1)[:nprobe]
+      candidates = np.concatenate([ivf['order'][ivf['offsets'][i]:ivf['offsets'][i + 1]] for i in lists]
+                                  + [np.arange(len(ivf['labels']), len(vectors))])
+      candidates.sort()
+    scores = np.asarray(vectors[candidates], dtype=np.float32) @ query
+    top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    self.metrics.observe('search_seconds', time.perf_counter() - start)
+    self.metrics.observe('candidates', len(candidates))
+    return [(self._urls[candidates[i]], float(scores[i])) for i in top]
+
+  def maybe_build(self):
+    ivf = self._ivf
+    indexed = 0 if ivf is None else len(ivf['labels'])
+    if len(self) - indexed < self.build_every:
+      return
+    with self._lock:
+      if self._builder is not None and self._builder.is_alive():
+        return
+      self._builder = threading.Thread(target=self.build, name='dense-index-build', daemon=True)
+      self._builder.start()
+
+  def build(self, retrain=False):
+    """
+    Extends (or retrains) the IVF lists to every row, False when another
+    process is building.
+    """
+    lock = self._flock('build.lock', blocking=False)
+    if lock is None:
+      return False
+    try:
+      start = time.perf_counter()
+      self._refresh()
+      vectors, ivf = self._vectors, self._ivf
+      if vectors is None:
+        return True
+      if retrain or ivf is None or len(vectors) >= 2 * ivf['trained_on']:
+        n_lists = max(1, min(int(np.sqrt(len(vectors))), 4096))
+        centroids = kmeans(vectors, n_lists)
+        labels = assign(vectors, centroids)
+        trained_on = len(vectors)
+        self.metrics.incr('retrained')
+      else:
+        centroids, trained_on = ivf['centroids'], ivf['trained_on']
+        labels = np.concatenate([ivf['labels'], assign(vectors[len(ivf['labels']):], centroids)])
+      # Written next to the target and moved, readers never load half a file
+      buffer = io.BytesIO()
+      np.savez(buffer, centroids=centroids, labels=labels, trained_on=trained_on)
+      tmp = self._path(f"ivf.npz.{os.getpid()}.tmp")
+      with open(tmp, 'wb') as fp:
+        fp.write(buffer.getvalue())
+      os.replace(tmp, self._path('ivf.npz'))
+      self._refresh()
+      self.metrics.observe('build_seconds', time.perf_counter() - start)
+      return True
+    finally:
+      lock.close()
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(version, root=DENSE_INDEX_DIR):
+  """
+  The index of a model version: embeddings of different models do not
+  compare, a new model starts an empty index next to the old one.
+  """
+  with _indexes_lock:
+    if version not in _indexes:
+      _indexes[version] = DenseIndex(os.path.join(root, hashlib.sha1(version.encode('utf-8')).hexdigest()[:16]))
+    return _indexes[version]
@@ -1,19 +1,52 @@
 from pickle import FALSE
-import nltk
-nltk.download('punkt')
-from nltk.corpus import stopwords
 import string
 import re
+import threading
+from bert.resources import lazy_import, require_nltk
 # Super important, think of adding stemming
 # https://medium.com/@mifthulyn07/comparing-text-documents-using-tf-idf-and-cosine-similarity-in-python-311863c74b2c
 
+class Preprocessor:
+  """
+  Tokenizer state that is built once and shared: the stopwords as a frozenset
+  (constant-time membership) and the punctuation translate table.
+  """
+  def __init__(self, language='english'):
+    # nltk and its bundled data are loaded here, on first use, not at import
+    require_nltk()
+    self.tokenize=lazy_import('nltk.tokenize').word_tokenize
+    # For now we have only the english text
+    self.stop=frozenset(lazy_import('nltk.corpus').stopwords.words(language))
+    self.table=str.maketrans('', '', string.punctuation)
+  def preprocess(self, text):
+    tokens=self.tokenize(text.lower().translate(self.table))
+    stop=self.stop
+    return [word for word in tokens if word not in stop]
+  def preprocess_many(self, texts):
+    # One call for every article of a request
+    return [self.preprocess(text) for text in texts]
+
+_preprocessor=None
+_preprocessor_lock=threading.Lock()
+
+def get_preprocessor():
+  global _preprocessor
+  with _preprocessor_lock:
+    if _preprocessor is None:
+      _preprocessor=Preprocessor()
+  return _preprocessor
+
+def preprocess_chunk(texts):
+  # Entry point inside the ETL worker processes, see bert/API/etl_pool.py
+  return get_preprocessor().preprocess_many(texts)
+
 class etl:
   def __init__(self, text):
-    # For now we have only the english text 
-    self.en_stop=stopwords.words('english')
     self.text=text
   def preprocess(self):
-    remove_punctuation_map = dict((ord(char), None) for char in string.punctuation)
-    new_text= nltk.word_tokenize(self.text.lower().translate(remove_punctuation_map))
-    query= [word for word in new_text if word not in self.en_stop]
-    return query
\ No newline at end of file
+    return get_preprocessor().preprocess(self.text)
+  @staticmethod
+  def preprocess_many(texts):
+    # Tokenization is CPU-bound, larger batches go to the per-worker process pool
+    from bert.API.etl_pool import preprocess_many
+    return preprocess_many(texts)
@@ -0,0 +1,60 @@
+import atexit
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from django.conf import settings
+from bert.API.etl import get_preprocessor, preprocess_chunk
+from bert.metrics import get_metrics
+
+# Processes per gunicorn worker; 1 keeps the ETL in the request thread
+ETL_PROCESSES = getattr(settings, 'ETL_PROCESSES', os.cpu_count() or 1)
+# Upper bound on texts shipped to a process per task
+ETL_CHUNK_SIZE = getattr(settings, 'ETL_CHUNK_SIZE', 4)
+# Smaller batches are cheaper to tokenize inline than to pickle across
+ETL_INLINE_BELOW = getattr(settings, 'ETL_INLINE_BELOW', 4)
+
+metrics = get_metrics('etl_pool')
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _warm_up():
+  # Stopwords and the translate table are loaded once per process, not per task
+  get_preprocessor()
+
+def get_pool():
+  """Long-lived process pool of this worker, created on first use."""
+  global _pool, _pool_pid
+  with _pool_lock:
+    # A pool inherited through fork belongs to the parent, never reuse it
+    if _pool is None or _pool_pid != os.getpid():
+      # spawn: the gunicorn worker has threads, forking it is not safe
+      _pool = ProcessPoolExecutor(max_workers=ETL_PROCESSES, mp_context=get_context('spawn'), initializer=_warm_up)
+      _pool_pid = os.getpid()
+      atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+  return _pool
+
+def _reset():
+  global _pool
+  with _pool_lock:
+    _pool = None
+
+def preprocess_many(texts):
+  """etl preprocessing of texts, spread over the worker's ETL processes in chunks."""
+  texts = list(texts)
+  if ETL_PROCESSES <= 1 or len(texts) < ETL_INLINE_BELOW:
+    return get_preprocessor().preprocess_many(texts)
+  size = max(1, min(ETL_CHUNK_SIZE, math.ceil(len(texts) / ETL_PROCESSES)))
+  chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+  metrics.incr('chunks', len(chunks))
+  try:
+    return [words for chunk in get_pool().map(preprocess_chunk, chunks) for words in chunk]
+  except BrokenProcessPool:
+    # A crashed child takes the pool down, rebuild it on the next request
+    metrics.incr('broken_pool')
+    _reset()
+    return get_preprocessor().preprocess_many(texts)
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+import numpy as np
+from django.conf import settings
+from bert.vocabulary import vocabulary
+
+# Versioned model directories, 'current' is a symlink to the published one
+IDF_MODEL_DIR = getattr(settings, 'IDF_MODEL_DIR', os.path.join(settings.BASE_DIR, '.cache/idf'))
+# Width of the fixed-size term array, longer terms are left out of the model
+IDF_MAX_TERM_BYTES = getattr(settings, 'IDF_MAX_TERM_BYTES', 48)
+IDF_KEEP_VERSIONS = 2
+
+def smooth_idf(df, n_docs):
+  # Same formula as the per-request fit in bert/API/similarity.py
+  return np.log((1 + n_docs) / (1 + df)) + 1
+
+def doc_key(key):
+  # 64-bit id of a counted document, so incremental builds never count it twice
+  return int.from_bytes(hashlib.sha1(key.encode('utf-8')).digest()[:8], 'little')
+
+class IdfModel:
+  """
+  Document frequencies of a background corpus: sorted fixed-width terms and
+  their df as .npy files opened with mmap_mode='r', so every gunicorn worker
+  shares one copy through the page cache.
+  """
+  def __init__(self, path):
+    self.path=path
+    self.terms=np.load(os.path.join(path, 'terms.npy'), mmap_mode='r')
+    self.df=np.load(os.path.join(path, 'df.npy'), mmap_mode='r')
+    with open(os.path.join(path, 'meta.json')) as fp:
+      self.n_docs=json.load(fp)['n_docs']
+    # vocabulary id -> idf, terms are looked up in the memmap once per worker
+    self._by_id={}
+    self._lock=threading.Lock()
+  def lookup(self, terms):
+    """df of each term, 0 for terms the corpus never saw."""
+    if len(self.terms) == 0 or not terms:
+      return np.zeros(len(terms), dtype=np.uint32)
+    encoded=[term.encode('utf-8') for term in terms]
+    keys=np.array(encoded, dtype=self.terms.dtype)
+    pos=np.minimum(np.searchsorted(self.terms, keys), len(self.terms) - 1)
+    hit=(self.terms[pos] == keys) & np.array([len(e) <= IDF_MAX_TERM_BYTES for e in encoded])
+    return np.where(hit, self.df[pos], 0)
+  def idf_of_ids(self, term_ids):
+    """idf weights of vocabulary ids, e.g. the columns of term_frequencies()."""
+    by_id=self._by_id
+    missing=[i for i in term_ids.tolist() if i not in by_id]
+    if missing:
+      values=smooth_idf(self.lookup([vocabulary.terms[i] for i in missing]), self.n_docs)
+      with self._lock:
+        by_id.update(zip(missing, values.tolist()))
+    return np.fromiter((by_id[i] for i in term_ids.tolist()), dtype=np.float64, count=len(term_ids))
+  def counts(self):
+    # Back to a Counter, to merge new documents into
+    return Counter({term.decode('utf-8'): int(df) for term, df in zip(self.terms, self.df)})
+  def seen(self):
+    return set(np.load(os.path.join(self.path, 'seen.npy')).tolist())
+
+_model=None
+_model_lock=threading.Lock()
+
+def get_model(root=IDF_MODEL_DIR):
+  """The published IdfModel, reopened when a newer version is published, or None."""
+  global _model
+  path=os.path.realpath(os.path.join(root, 'current'))
+  if not os.path.isfile(os.path.join(path, 'meta.json')):
+    return None
+  with _model_lock:
+    if _model is None or _model.path != path:
+      _model=IdfModel(path)
+    return _model
+
+def count_documents(token_lists, counts=None):
+  counts=counts if counts is not None else Counter()
+  for tokens in token_lists:
+    counts.update(set(tokens))
+  return counts
+
+def publish(counts, n_docs, seen, root=IDF_MODEL_DIR):
+  """Writes a new model version and atomically points 'current' at it."""
+  terms=sorted(term.encode('utf-8') for term in counts if len(term.encode('utf-8')) <= IDF_MAX_TERM_BYTES)
+  path=os.path.join(root, f"v{time.time_ns()}")
+  os.makedirs(path)
+  np.save(os.path.join(path, 'terms.npy'), np.array(terms, dtype=f"S{IDF_MAX_TERM_BYTES}"))
+  np.save(os.path.join(path, 'df.npy'), np.array([counts[t.decode('utf-8')] for t in terms], dtype=np.uint32))
+  np.save(os.path.join(path, 'seen.npy'), np.array(sorted(seen), dtype=np.uint64))
+  with open(os.path.join(path, 'meta.json'), 'w') as fp:
+    json.dump({'n_docs': n_docs, 'n_terms': len(terms), 'built_at': time.time()}, fp)
+  link=os.path.join(root, f"current.{os.getpid()}.tmp")
+  os.symlink(os.path.basename(path), link)
+  os.replace(link, os.path.join(root, 'current'))
+  # Workers still mapping an old version keep reading it, unlinked files live on until unmapped
+  versions=sorted(name for name in os.listdir(root) if name.startswith('v'))
+  for name in versions[:-IDF_KEEP_VERSIONS]:
+    shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+  return path
@@ -0,0 +1,184 @@
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+from itertools import groupby
+import numpy as np
+from django.conf import settings
+from bert.metrics import get_metrics
+
+SENTIMENT_MAX_LENGTH = 128
+# Padded lengths a batch can have, the last one must be SENTIMENT_MAX_LENGTH
+SENTIMENT_BUCKETS = getattr(settings, 'SENTIMENT_BUCKETS', (32, 64, 128))
+SENTIMENT_BATCH_SIZE = getattr(settings, 'SENTIMENT_BATCH_SIZE', 32)
+# Long texts are scored as overlapping windows of SENTIMENT_MAX_LENGTH tokens
+# (needs a fast tokenizer), otherwise they are truncated to the first window
+SENTIMENT_WINDOWS = getattr(settings, 'SENTIMENT_WINDOWS', True)
+# Tokens shared by consecutive windows
+SENTIMENT_STRIDE = getattr(settings, 'SENTIMENT_STRIDE', 32)
+SENTIMENT_MAX_WINDOWS = getattr(settings, 'SENTIMENT_MAX_WINDOWS', 8)
+# 'mean', or 'attention': windows weighted by how decisive their score is
+SENTIMENT_POOLING = getattr(settings, 'SENTIMENT_POOLING', 'mean')
+MODEL_INPUTS = ('input_ids', 'attention_mask', 'token_type_ids')
+# Micro-batching across the request threads of a worker
+INFERENCE_BATCHING = getattr(settings, 'INFERENCE_BATCHING', True)
+INFERENCE_MAX_BATCH = getattr(settings, 'INFERENCE_MAX_BATCH', 64)
+# Longest an input waits for others to join its batch
+INFERENCE_MAX_WAIT = getattr(settings, 'INFERENCE_MAX_WAIT', 0.01)
+
+metrics = get_metrics('sentiment')
+
+def softmax(logits):
+  logits = logits - logits.max(axis=-1, keepdims=True)
+  exp = np.exp(logits)
+  return exp / exp.sum(axis=-1, keepdims=True)
+
+def _bucket(length):
+  return next((bound for bound in SENTIMENT_BUCKETS if length <= bound), SENTIMENT_MAX_LENGTH)
+
+def windows(tokenizer, words):
+  """
+  (rows, owners): the model input rows of every word list, one per window,
+  and the index of the text each row belongs to. A text is tokenized once;
+  past SENTIMENT_MAX_WINDOWS windows an evenly spread subset is kept, so the
+  whole article is still covered.
+  """
+  sliding = SENTIMENT_WINDOWS and getattr(tokenizer, 'is_fast', False)
+  encoded = tokenizer(words, is_split_into_words=True, max_length=SENTIMENT_MAX_LENGTH, truncation=True,
+                      return_overflowing_tokens=sliding, stride=SENTIMENT_STRIDE if sliding else 0)
+  owners = list(encoded['overflow_to_sample_mapping']) if sliding else list(range(len(words)))
+  keys = [key for key in MODEL_INPUTS if key in encoded]
+  keep = []
+  for owner, members in groupby(range(len(owners)), key=owners.__getitem__):
+    members = list(members)
+    if len(members) > SENTIMENT_MAX_WINDOWS:
+      members = [members[i] for i in np.linspace(0, len(members) - 1, SENTIMENT_MAX_WINDOWS).round().astype(int)]
+    keep.extend(members)
+    metrics.observe('windows', len(members))
+  rows = [{key: encoded[key][i] for key in keys} for i in keep]
+  return rows, [owners[i] for i in keep]
+
+def pool(scores):
+  """One score out of a text's window scores."""
+  scores = np.asarray(scores, dtype=np.float64)
+  if len(scores) == 1 or SENTIMENT_POOLING == 'mean':
+    return float(scores.mean())
+  # attention: softmax over each window's |logit|, decisive windows dominate neutral ones
+  p = np.clip(scores, 1e-6, 1 - 1e-6)
+  weights = softmax(np.abs(np.log(p / (1 - p))))
+  return float(weights @ scores)
+
+def _padded_batches(model, tokenizer, rows):
+  """
+  (members, features) of every batch. Rows are sorted by length and padded
+  per length bucket, so short texts are not padded to SENTIMENT_MAX_LENGTH and
+  the model only ever sees len(SENTIMENT_BUCKETS) input shapes.
+  """
+  lengths = [len(row['input_ids']) for row in rows]
+  order = sorted(range(len(rows)), key=lengths.__getitem__)
+  for bound, members in groupby(order, key=lambda i: _bucket(lengths[i])):
+    members = list(members)
+    for start in range(0, len(members), SENTIMENT_BATCH_SIZE):
+      batch = members[start:start + SENTIMENT_BATCH_SIZE]
+      features = tokenizer.pad({key: [rows[i][key] for i in batch] for key in rows[batch[0]]},
+                               padding='max_length', max_length=bound, return_tensors=model.tensor_type)
+      yield batch, features
+
+def run_batches(model, tokenizer, rows):
+  """Positive-class probability of each tokenized row ({'input_ids': [...], ...})."""
+  scores = [0.0] * len(rows)
+  for batch, features in _padded_batches(model, tokenizer, rows):
+    predictions = softmax(model(features)["logits"])[:, 1]
+    for i, prediction in zip(batch, predictions):
+      scores[i] = float(prediction)
+    metrics.incr('batches')
+    metrics.observe('batch_size', len(batch))
+  return scores
+
+def run_embeddings(model, tokenizer, rows):
+  """L2-normalized pooled encoder output of each tokenized row, float32 (len(rows), hidden)."""
+  out = None
+  for batch, features in _padded_batches(model, tokenizer, rows):
+    vectors = np.asarray(model.embed(features), dtype=np.float32)
+    if out is None:
+      out = np.zeros((len(rows), vectors.shape[1]), dtype=np.float32)
+    out[batch] = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+  return out
+
+Pending = namedtuple('Pending', ['row', 'future', 'enqueued'])
+
+class InferenceScheduler:
+  """
+  Micro-batching in front of the worker's model. score() calls from every
+  request thread are queued; one thread takes up to max_batch rows, waiting
+  at most max_wait after the oldest one, runs them together and hands each
+  caller its own scores.
+  """
+  def __init__(self, model, tokenizer, max_batch=INFERENCE_MAX_BATCH, max_wait=INFERENCE_MAX_WAIT):
+    self.model = model
+    self.tokenizer = tokenizer
+    self.max_batch = max_batch
+    self.max_wait = max_wait
+    self.tensor_type = model.tensor_type
+    self.model_version = getattr(model, 'model_version', None)
+    self.can_embed = getattr(model, 'can_embed', False)
+    self.metrics = get_metrics('inference_scheduler')
+    self._queue = queue.Queue()
+    self._thread = None
+    self._pid = None
+    self._lock = threading.Lock()
+
+  def __call__(self, features):
+    # Direct, unqueued call
+    return self.model(features)
+
+  def embed(self, features):
+    # Embeddings are built off the request path, they skip the queue
+    return self.model.embed(features)
+
+  def score(self, rows):
+    self._ensure_thread()
+    pending = [Pending(row, Future(), time.monotonic()) for row in rows]
+    for item in pending:
+      self._queue.put(item)
+    self.metrics.observe('queue_depth', self._queue.qsize())
+    return [item.future.result() for item in pending]
+
+  def _ensure_thread(self):
+    with self._lock:
+      # A thread does not survive a fork, start one in each gunicorn worker
+      if self._thread is None or self._pid != os.getpid():
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name='inference-scheduler', daemon=True)
+        self._pid = os.getpid()
+        self._thread.start()
+
+  def _collect(self):
+    batch = [self._queue.get()]
+    deadline = batch[0].enqueued + self.max_wait
+    while len(batch) < self.max_batch:
+      remaining = deadline - time.monotonic()
+      try:
+        batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+      except queue.Empty:
+        break
+    return batch
+
+  def _loop(self):
+    while True:
+      batch = self._collect()
+      started = time.monotonic()
+      for item in batch:
+        self.metrics.observe('wait_seconds', started - item.enqueued)
+      self.metrics.observe('batch_size', len(batch))
+      try:
+        scores = run_batches(self.model, self.tokenizer, [item.row for item in batch])
+      except Exception as exc:
+        for item in batch:
+          item.future.set_exception(exc)
+        continue
+      for item, score in zip(batch, scores):
+        item.future.set_result(score)
+      self.metrics.observe('run_seconds', time.monotonic() - started)
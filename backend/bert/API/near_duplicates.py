@@ -0,0 +1,74 @@
+from collections import defaultdict
+import numpy as np
+from django.conf import settings
+from bert.metrics import get_metrics
+
+# Syndicated copies of an article are scored once (bert/API/tf_in_use.py)
+NEAR_DUPLICATES = getattr(settings, 'NEAR_DUPLICATES', True)
+# Differing SimHash bits (of 64) that still make two articles copies
+SIMHASH_MAX_DISTANCE = getattr(settings, 'SIMHASH_MAX_DISTANCE', 6)
+# Token n-grams hashed, and the shortest article fingerprinted (shorter ones stay alone)
+SIMHASH_SHINGLE = 3
+SIMHASH_MIN_LENGTH = 20
+
+metrics = get_metrics('near_duplicates')
+
+_BITS = np.arange(64, dtype=np.uint64)
+_POSITIONS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0x27D4EB2F165667C5],
+                      dtype=np.uint64)
+
+def _mix(x):
+  # splitmix64 finalizer, spreads the shingle hashes over all 64 bits
+  x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+  x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+  return x ^ (x >> np.uint64(31))
+
+def simhash(ids, shingle=SIMHASH_SHINGLE):
+  """64-bit SimHash of a token id array, over its shingle-token n-grams."""
+  ids = np.asarray(ids, dtype=np.uint64)
+  shingle = min(shingle, len(ids), len(_POSITIONS))
+  if not shingle:
+    return 0
+  grams = np.lib.stride_tricks.sliding_window_view(ids, shingle)
+  # Position multipliers make the n-gram hash order-sensitive, uint64 arithmetic wraps
+  hashes = _mix((grams * _POSITIONS[:shingle]).sum(axis=1, dtype=np.uint64))
+  votes = 2 * ((hashes[:, None] >> _BITS) & np.uint64(1)).sum(axis=0, dtype=np.int64) - len(hashes)
+  return sum(1 << int(bit) for bit in np.flatnonzero(votes > 0))
+
+def clusters(docs, max_distance=SIMHASH_MAX_DISTANCE):
+  """
+  Index groups of near-duplicate docs (token id arrays), each in order with
+  its first doc as representative, groups ordered by representative. Two docs
+  within max_distance bits of each other share one of max_distance + 1 bands
+  of their SimHash (pigeonhole), so only docs in a common band bucket are
+  compared.
+  """
+  parent = list(range(len(docs)))
+  def find(i):
+    while parent[i] != i:
+      parent[i] = parent[parent[i]]
+      i = parent[i]
+    return i
+  hashes = {i: simhash(doc) for i, doc in enumerate(docs) if len(doc) >= SIMHASH_MIN_LENGTH}
+  bands = max_distance + 1
+  width = 64 // bands
+  for band in range(bands):
+    shift = band * width
+    mask = (1 << (64 - shift if band == bands - 1 else width)) - 1
+    buckets = defaultdict(list)
+    for i, value in hashes.items():
+      buckets[(value >> shift) & mask].append(i)
+    for members in buckets.values():
+      for a in range(len(members)):
+        for b in members[a + 1:]:
+          if bin(hashes[members[a]] ^ hashes[b]).count('1') <= max_distance:
+            # The earlier doc (better search rank) stays the representative
+            first, second = sorted((find(members[a]), find(b)))
+            parent[second] = first
+  groups = defaultdict(list)
+  for i in range(len(docs)):
+    groups[find(i)].append(i)
+  out = [groups[root] for root in sorted(groups)]
+  metrics.incr('articles', len(docs))
+  metrics.incr('duplicates', len(docs) - len(out))
+  return out
@@ -0,0 +1,65 @@
+import numpy as np
+from django.conf import settings
+from bert.metrics import get_metrics
+from bert.vocabulary import term_frequencies
+
+# Passages are windows of preprocessed tokens (punctuation is gone, so no sentences)
+PASSAGE_LENGTH = getattr(settings, 'PASSAGE_LENGTH', 64)
+PASSAGE_STRIDE = getattr(settings, 'PASSAGE_STRIDE', 48)
+# Passages per article sent to the sentiment model, 0 sends whole articles
+PASSAGE_TOP_K = getattr(settings, 'PASSAGE_TOP_K', 3)
+BM25_K1 = getattr(settings, 'BM25_K1', 1.5)
+BM25_B = getattr(settings, 'BM25_B', 0.75)
+
+metrics = get_metrics('passages')
+
+def split(doc, length=PASSAGE_LENGTH, stride=PASSAGE_STRIDE):
+  """Start offsets of the overlapping passages of doc, the last one reaching its end."""
+  if len(doc) <= length:
+    return [0]
+  starts = list(range(0, len(doc) - length, stride))
+  return starts + [len(doc) - length]
+
+def bm25(query, passages, k1=BM25_K1, b=BM25_B):
+  """Okapi BM25 of every passage (id arrays) for query, statistics from these passages only."""
+  counts, terms = term_frequencies(passages)
+  query_terms = np.intersect1d(query, terms)
+  if len(query_terms) == 0:
+    return np.zeros(len(passages))
+  tf = counts[:, np.searchsorted(terms, query_terms)].toarray()
+  df = (tf > 0).sum(axis=0)
+  idf = np.log((len(passages) - df + 0.5) / (df + 0.5) + 1)
+  lengths = np.array([len(passage) for passage in passages], dtype=np.float64)
+  norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1))
+  return (tf * (k1 + 1) / (tf + norm[:, None])) @ idf
+
+def top_passages(query, docs, k=PASSAGE_TOP_K, length=PASSAGE_LENGTH):
+  """
+  Each doc cut down to its k best passages for query, ranked together over
+  every passage of the request and kept in reading order.
+  """
+  if not k or not docs:
+    return list(docs)
+  offsets = [split(doc) for doc in docs]
+  passages = [doc[start:start + length] for doc, starts in zip(docs, offsets) for start in starts]
+  scores = bm25(query, passages)
+  out = []
+  first = 0
+  for doc, starts in zip(docs, offsets):
+    doc_scores = scores[first:first + len(starts)]
+    first += len(starts)
+    if len(starts) <= k:
+      out.append(doc)
+      continue
+    # Overlapping winners are merged, no token is fed to the model twice
+    mask = np.zeros(len(doc), dtype=bool)
+    best = np.argsort(-doc_scores, kind='stable')[:k]
+    # Passages without a query term only fill in when none has one (the lede is kept then)
+    if doc_scores[best[0]] > 0:
+      best = best[doc_scores[best] > 0]
+    for i in best:
+      mask[starts[i]:starts[i] + length] = True
+    out.append(doc[mask])
+  metrics.incr('tokens_in', sum(len(doc) for doc in docs))
+  metrics.incr('tokens_out', sum(len(doc) for doc in out))
+  return out
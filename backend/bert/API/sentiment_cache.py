@@ -0,0 +1,179 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from django.conf import settings
+from bert.metrics import get_metrics
+
+SENTIMENT_CACHE_SIZE = getattr(settings, 'SENTIMENT_CACHE_SIZE', 20000)
+SENTIMENT_CACHE_TTL = getattr(settings, 'SENTIMENT_CACHE_TTL', 7 * 24 * 3600)
+# SQLite file shared by every worker on the node, None for in-process only
+SENTIMENT_CACHE_PATH = getattr(settings, 'SENTIMENT_CACHE_PATH', os.path.join(settings.BASE_DIR, '.cache/sentiment.sqlite3'))
+SENTIMENT_CACHE_MAX_ENTRIES = getattr(settings, 'SENTIMENT_CACHE_MAX_ENTRIES', 200000)
+# Expired and overflow rows are dropped every this many writes
+SENTIMENT_CACHE_PRUNE_EVERY = 5000
+# Keys per IN (...) lookup, under SQLite's bound parameter limit
+SQLITE_MAX_PARAMS = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, score REAL NOT NULL, expires REAL NOT NULL) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS scores_expires ON scores (expires);
+"""
+
+def fingerprint(path):
+  """Version of a saved model (a file or a directory): a hash of its files' names, sizes and mtimes."""
+  digest = hashlib.sha1()
+  if os.path.isfile(path):
+    st = os.stat(path)
+    digest.update(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns};".encode('utf-8'))
+    return digest.hexdigest()[:16]
+  for dirpath, _, filenames in sorted(os.walk(path)):
+    for name in sorted(filenames):
+      full = os.path.join(dirpath, name)
+      st = os.stat(full)
+      digest.update(f"{os.path.relpath(full, path)}:{st.st_size}:{st.st_mtime_ns};".encode('utf-8'))
+  return digest.hexdigest()[:16]
+
+def model_version(model):
+  # Set by ApiConfig when it loads a model; scores of an unversioned model are never cached
+  return getattr(model, 'model_version', None)
+
+class SharedScores:
+  """
+  The node-wide tier: one SQLite table keyed by the cache key (WAL mode, one
+  connection per thread). A batch is looked up with one indexed query and
+  written in one transaction; retention runs every SENTIMENT_CACHE_PRUNE_EVERY
+  writes, never per key.
+  """
+  def __init__(self, path, ttl=SENTIMENT_CACHE_TTL, max_entries=SENTIMENT_CACHE_MAX_ENTRIES):
+    self.path = path
+    self.ttl = ttl
+    self.max_entries = max_entries
+    self._local = threading.local()
+    self._writes = 0
+
+  def _connection(self):
+    conn = getattr(self._local, 'conn', None)
+    # Connections are not carried over a fork
+    if conn is None or self._local.pid != os.getpid():
+      os.makedirs(os.path.dirname(self.path), exist_ok=True)
+      conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('PRAGMA synchronous=NORMAL')
+      conn.executescript(SCHEMA)
+      self._local.conn = conn
+      self._local.pid = os.getpid()
+    return conn
+
+  def get_many(self, keys):
+    found = {}
+    now = time.time()
+    try:
+      conn = self._connection()
+      for start in range(0, len(keys), SQLITE_MAX_PARAMS):
+        chunk = keys[start:start + SQLITE_MAX_PARAMS]
+        found.update(conn.execute(
+          'SELECT key, score FROM scores WHERE key IN ({}) AND expires > ?'.format(', '.join('?' * len(chunk))),
+          (*chunk, now)).fetchall())
+    except sqlite3.Error as exc:
+      # The cache is an accelerator, a locked or broken file is a miss
+      print(f"Sentiment cache lookup failed: {exc}")
+    return found
+
+  def set_many(self, scores):
+    expires = time.time() + self.ttl
+    try:
+      conn = self._connection()
+      conn.execute('BEGIN IMMEDIATE')
+      try:
+        conn.executemany('INSERT OR REPLACE INTO scores (key, score, expires) VALUES (?, ?, ?)',
+                         [(key, score, expires) for key, score in scores.items()])
+        conn.execute('COMMIT')
+      except sqlite3.Error:
+        conn.execute('ROLLBACK')
+        raise
+    except sqlite3.Error as exc:
+      print(f"Sentiment cache write failed: {exc}")
+      return
+    previous, self._writes = self._writes, self._writes + len(scores)
+    if previous // SENTIMENT_CACHE_PRUNE_EVERY != self._writes // SENTIMENT_CACHE_PRUNE_EVERY:
+      self.prune()
+
+  def prune(self):
+    """Drops expired scores, then all but the max_entries latest to expire."""
+    try:
+      conn = self._connection()
+      conn.execute('DELETE FROM scores WHERE expires <= ?', (time.time(),))
+      conn.execute('DELETE FROM scores WHERE key IN (SELECT key FROM scores '
+                   'ORDER BY expires DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+    except sqlite3.Error as exc:
+      print(f"Sentiment cache prune failed: {exc}")
+
+class SentimentCache:
+  """
+  Sentiment score per (truncated model input, model version). An in-process
+  LRU sits in front of a SQLite table shared by the gunicorn workers; both
+  start over when the model version changes.
+  """
+  def __init__(self, ttl=SENTIMENT_CACHE_TTL, max_entries=SENTIMENT_CACHE_SIZE, path=SENTIMENT_CACHE_PATH):
+    self.ttl = ttl
+    self.max_entries = max_entries
+    self.shared = SharedScores(path, ttl) if path else None
+    self.metrics = get_metrics('sentiment_cache')
+    self._local = OrderedDict()
+    self._version = None
+    # Running mean of the model time per text, to value a hit
+    self._per_text = None
+    self._lock = threading.Lock()
+
+  @staticmethod
+  def key(input_ids, version):
+    # input_ids are already truncated to the model's max length, i.e. exactly what it scores
+    digest = hashlib.sha1(np.asarray(input_ids, dtype=np.int32).tobytes()).hexdigest()
+    return f"sent:{version}:{digest}"
+
+  def get_many(self, keys, version):
+    found = {}
+    with self._lock:
+      if version != self._version:
+        # ApiConfig.model changed, old scores are for another model
+        self._local.clear()
+        self._version = version
+      for key in keys:
+        if key in self._local:
+          self._local.move_to_end(key)
+          found[key] = self._local[key]
+    missing = [key for key in keys if key not in found]
+    if self.shared is not None and missing:
+      shared = self.shared.get_many(missing)
+      self._remember(shared)
+      found.update(shared)
+      self.metrics.incr('shared_hits', len(shared))
+    self.metrics.incr('hits', len(found))
+    self.metrics.incr('misses', len(keys) - len(found))
+    if found and self._per_text is not None:
+      self.metrics.incr('saved_seconds', len(found) * self._per_text)
+    return found
+
+  def set_many(self, scores):
+    self._remember(scores)
+    if self.shared is not None and scores:
+      self.shared.set_many(scores)
+
+  def inference(self, seconds, n_texts):
+    per_text = seconds / n_texts
+    self._per_text = per_text if self._per_text is None else 0.9 * self._per_text + 0.1 * per_text
+    self.metrics.observe('inference_seconds_per_text', per_text)
+
+  def _remember(self, scores):
+    with self._lock:
+      for key, score in scores.items():
+        self._local[key] = score
+        self._local.move_to_end(key)
+      while len(self._local) > self.max_entries:
+        self._local.popitem(last=False)
+
+sentiment_cache = SentimentCache()
@@ -0,0 +1,33 @@
+import numpy as np
+from scipy.sparse import diags
+from bert.vocabulary import term_frequencies
+from bert.API.idf_model import get_model
+
+# Cosine similarity of the query against every article of a request.
+# One TF-IDF fit over query + articles, so the IDF reflects the whole result
+# set instead of a single (query, article) pair, and one sparse product.
+# When a background-corpus model is published (bert/API/idf_model.py) its IDF
+# is used instead, so scores do not depend on what else the search returned.
+
+def idf(counts):
+  # sklearn's smooth idf: ln((1 + n) / (1 + df)) + 1
+  n_docs = counts.shape[0]
+  df = np.bincount(counts.indices, minlength=counts.shape[1])
+  return np.log((1 + n_docs) / (1 + df)) + 1
+
+def tfidf(counts, weights):
+  # Scaled columns, then l2-normalized rows, so a dot product is the cosine
+  matrix = counts @ diags(weights)
+  norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+  norms[norms == 0] = 1
+  return diags(1 / norms) @ matrix
+
+def similarities(query, docs):
+  """Cosine similarity of query with each of docs (vocabulary id arrays), as a numpy array."""
+  counts, terms = term_frequencies([query] + list(docs))
+  if counts.shape[1] == 0:
+    return np.zeros(len(docs))
+  model = get_model()
+  weights = model.idf_of_ids(terms) if model is not None else idf(counts)
+  vectors = tfidf(counts, weights).tocsr()
+  return (vectors[1:] @ vectors[0].T).toarray().ravel()
@@ -4,64 +4,122 @@
 # !python3 -m venv ~/venv-metal                                             
 # !source ~/venv-metal/bin/activate
 # !pip install -r requirements.txt
-import tensorflow as tf
 from pickle import FALSE
-import pandas as pd
 from bert.parser.Parser import text
-import nltk
-nltk.download('punkt')
-from nltk.corpus import stopwords
-from sklearn.feature_extraction.text import TfidfVectorizer
+from bert.resources import lazy_import
+from bert.API.etl import get_preprocessor
+from bert.vocabulary import vocabulary
+from bert.API.similarity import similarities
+from bert.API.passages import top_passages
+from bert.API.near_duplicates import clusters, NEAR_DUPLICATES
+from bert.API.inference import InferenceScheduler, run_batches, windows, pool
+from bert.API.sentiment_cache import sentiment_cache, model_version
+from bert.API.dense_index import get_index, embed_texts, DENSE_INDEX_MODE
+from bert.parser.article_index import article_index, ARTICLE_INDEX_MODE
+import time
+from itertools import groupby
 # Library to sort similarity
 from operator import itemgetter
-# Import cosine similarity library
-from sklearn.metrics.pairwise import linear_kernel
+# The model runtime (bert/API/backends.py) and pandas are imported on first use, see bert/resources.py
 
 # Our precious sentiment analysis
-def get_sent(senttext, model, tokenizer):
-  tf_batch = tokenizer(senttext, max_length=128, padding=True, truncation=True, return_tensors='tf')
-  tf_outputs = model(tf_batch)
-  tf_predictions = tf.nn.softmax(tf_outputs["logits"][0], axis=-1)
-  return tf_predictions.numpy()[1]
+def get_sents(senttexts, model, tokenizer):
+  """
+  Positive-class probability of every text (a string or a list of words).
+  Each text is tokenized once into overlapping windows (bert/API/inference.py);
+  cached window scores are reused, the rest go through the model in
+  length-bucketed batches, through the worker's micro-batching queue when
+  model is an InferenceScheduler, and each text's windows are pooled.
+  """
+  words = [senttext.split() if isinstance(senttext, str) else list(senttext) for senttext in senttexts]
+  rows, owners = windows(tokenizer, words)
+  scores = [None] * len(rows)
+  # Syndicated articles recur across queries, known (input, model version) pairs skip the model
+  version = model_version(model)
+  keys = [sentiment_cache.key(row['input_ids'], version) for row in rows] if version else []
+  if keys:
+    cached = sentiment_cache.get_many(keys, version)
+    for i, key in enumerate(keys):
+      scores[i] = cached.get(key)
+  todo = [i for i in range(len(rows)) if scores[i] is None]
+  if todo:
+    start_time = time.perf_counter()
+    if isinstance(model, InferenceScheduler):
+      results = model.score([rows[i] for i in todo])
+    else:
+      results = run_batches(model, tokenizer, [rows[i] for i in todo])
+    for i, score in zip(todo, results):
+      scores[i] = score
+    sentiment_cache.inference(time.perf_counter() - start_time, len(todo))
+    if keys:
+      sentiment_cache.set_many({keys[i]: scores[i] for i in todo})
+  # Rows come out grouped by text, in order
+  return [pool([scores[i] for i in members]) for _, members in groupby(range(len(rows)), key=owners.__getitem__)]
+
+def dense_index_for(model):
+  # The dense article index of this model, None when it is off or the backend cannot embed.
+  # Hits are read back from the article index, without it no embedding is worth computing
+  version = model_version(model)
+  if DENSE_INDEX_MODE == 'off' or ARTICLE_INDEX_MODE == 'off' or not version or not getattr(model, 'can_embed', False):
+    return None
+  return get_index(version)
 
-# Cosine similarity
-# We preprocess both a and b, so no need for a preprocess step in the tokenizer, like etl.proprocess
-def compute_similarity(query, b):
-  vectorizer = TfidfVectorizer(tokenizer=lambda i:i, lowercase=False) #tokenizer=self.preprocess
-  comp_lst=[query, b[0]]
-  tfidf = vectorizer.fit_transform(comp_lst)
-  cosine_similarities = linear_kernel(tfidf[0:1], tfidf).flatten()
-  return cosine_similarities[1]
-  
 class prod:
   def __init__(self, query, model, tokenizer, etl):
-    self.en_stop=stopwords.words('english')
+    self.en_stop=get_preprocessor().stop
     self.etl=etl
     self.query=query
     self.model=model
     self.tokenizer=tokenizer
   #This will return a list (not yet but close) of the sources and the score or similarity (words and sentiment)
   def comparison_list(self):
-    articles,links=text(self.query,self.etl)
-    querysent=get_sent(self.query,self.model,self.tokenizer)
-    sentlist=[]
+    articles,links,metadata=text(self.query,self.etl)
+    index=dense_index_for(self.model)
+    if index is not None:
+      # Every scraped article is embedded in the background for later queries
+      new=[i for i in range(len(links)) if links[i] not in index]
+      index.add_later(self.model,self.tokenizer,[links[i] for i in new],[vocabulary.decode(articles[i]) for i in new])
+      # merge: the known articles nearest to the query in embedding space join the candidates
+      seen=set(links)
+      hits=index.search(embed_texts(self.model,self.tokenizer,[list(self.query)])[0]) if len(index) else []
+      for url,words,meta in article_index.get([url for url,_ in hits if url not in seen]):
+        articles.append(vocabulary.encode(words))
+        links.append(url)
+        metadata.append(meta)
+    query_ids=vocabulary.encode(self.query)
+    # Syndicated copies (SimHash near-duplicates) are scored once, through the first of
+    # them; the rest are listed with it under Duplicates and share its scores
+    groups=clusters(articles) if NEAR_DUPLICATES else [[i] for i in range(len(articles))]
+    valid_docs=[]
     valid_urls=[]
+    valid_meta=[]
+    valid_copies=[]
     sim=[]
-    j=0
-    # Was articles[i]*1.25
-    for i in range(len(articles)):
-      temp=(compute_similarity(self.query, articles[i])*1.25)
+    # One TF-IDF fit over the query and every distinct article. Was articles[i]*1.25
+    scores=similarities(query_ids, [articles[group[0]] for group in groups])*1.25
+    for group,temp in zip(groups,scores):
+      i=group[0]
       # Take only non-empty/relevant articles
-      if temp!=0 and articles[i][0]!=[]:
+      if temp!=0 and len(articles[i]):
         sim.append(temp)
-        sentsimilarity=1-abs(get_sent(articles[i][0] if not all(isinstance(i, type(list)) for i in articles[i]) else articles[i],self.model,self.tokenizer)-querysent)
-        sentlist.append(sentsimilarity)
-        valid_urls.append(links[j])
-        j+=1
+        valid_docs.append(articles[i])
+        valid_urls.append(links[i])
+        valid_meta.append(metadata[i])
+        valid_copies.append([links[j] for j in group[1:]])
+    # The query and every kept article go through the model together, in batches
+    # BERT only reads the passages of each article that best match the query (BM25)
+    passages=top_passages(query_ids, valid_docs)
+    sents=get_sents([self.query]+[vocabulary.decode(passage) for passage in passages],self.model,self.tokenizer)
+    querysent=sents[0]
+    sentlist=[1-abs(sent-querysent) for sent in sents[1:]]
     # Final output section
     res_dic=[{'URL':valid_urls, 'Similarity Match':[sim[l] for l in range(len(valid_urls))], 'Sentiment Match':[sentlist[l] for l in range(len(valid_urls))]}]
     # Sort for similarity
     dic_sorted = sorted(res_dic, key=itemgetter('Similarity Match'), reverse=True)[0]
     match_score= [dic_sorted["Similarity Match"][i] * dic_sorted["Sentiment Match"][i] for i in range(len(sim))]
-    out_dic={'URL':valid_urls, "Match": match_score}
-    return pd.DataFrame(out_dic)
\ No newline at end of file
+    out_dic={'URL':valid_urls, "Match": match_score,
+             'Title':[m.title or (m.h1[0] if m.h1 else '') for m in valid_meta],
+             'Author':[', '.join(m.author) for m in valid_meta],
+             'Published':[m.published[0] if m.published else '' for m in valid_meta],
+             'Duplicates':valid_copies}
+    return lazy_import('pandas').DataFrame(out_dic)
\ No newline at end of file
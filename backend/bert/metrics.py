@@ -0,0 +1,51 @@
+# coding=utf-8
+# Copyright 2022 factual research team.
+#
+import threading
+from collections import defaultdict
+
+
+class Metrics():
+    """
+    Thread-safe counters and timings for one pipeline component.
+    Values are per worker process; /api/metrics/ reports the worker that answers.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._observations = {}
+
+    def incr(self, key, n=1):
+        with self._lock:
+            self._counters[key] += n
+
+    def observe(self, key, value):
+        # Keeps count, total and max so averages can be derived from a snapshot
+        with self._lock:
+            count, total, peak = self._observations.get(key, (0, 0.0, value))
+            self._observations[key] = (count + 1, total + value, max(peak, value))
+
+    def snapshot(self):
+        with self._lock:
+            out = dict(self._counters)
+            for key, (count, total, peak) in self._observations.items():
+                out[key] = {'count': count, 'mean': total / count, 'max': peak}
+            return out
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_metrics(name):
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Metrics(name)
+        return _registry[name]
+
+
+def snapshot():
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {m.name: m.snapshot() for m in metrics}
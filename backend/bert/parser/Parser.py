@@ -1,204 +1,130 @@
 import requests
-import urllib3
-from bs4 import BeautifulSoup
-import pandas as pd
-from bert.parser.get_user_agent import get_useragent
-import re
 from pickle import FALSE
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-import browser_cookie3
-from django.conf import settings
-ISALLOWED_TOKENS = getattr(settings, 'ISALLOWED_TOKENS', [])
-from fake_headers import Headers
+from selenium.common.exceptions import WebDriverException
 import time #giorgos_ster
-import concurrent.futures, requests
-# disable warnings for insecure requests
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+import concurrent.futures
+from bert.parser.search import get_provider, SearchBlocked
+from bert.vocabulary import vocabulary
+from bert.parser.fetcher import fetch_all
+from bert.parser.search_cache import search_cache
+from bert.parser.article_store import article_store
+from bert.parser.article_index import (article_index, coverage, ARTICLE_INDEX_MODE, ARTICLE_INDEX_MIN_HITS,
+                                       ARTICLE_INDEX_MIN_COVERAGE)
+from bert.parser.politeness import is_block_page, metrics as politeness_metrics
+from bert.parser.extract import article as extract_article, ArticleMetadata, EMPTY_METADATA
 
-# Every 3-4 sessions open it
-# Import ips kai vazo kai user agents kai den me anagnorizei
-class ChromeSocket():
-    def __init__(self):
-        self.session=requests.Session()
-        self.session.verify = False
-        self.session.trust_env = False
-        headers= Headers(
-        # generate any browser & os headeers
-        headers=False  # don`t generate misc headers
-    )
-        self.header=headers.generate()
-        self.cookies = browser_cookie3.chrome()
-    def get_text(self, url):
-        try:
-            r = self.session.get(url=url,headers=self.header ,allow_redirects=False ,cookies=self.cookies, timeout=15)
-        except requests.exceptions.InvalidHeader:
-            self.header=get_useragent()
-        r = self.session.get(url=url,headers=self.header ,allow_redirects=False ,cookies=self.cookies, timeout=15)
-        _encoding = BeautifulSoup(r.text, "html5lib")
-        return _encoding
-    def g_search(self, url):
-        links=[]
-        options = Options()
-        options.add_argument("--headless=new")
-        driver = webdriver.Chrome(options)
-        driver.get(url)
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        search=soup.find_all('div', class_="yuRUbf")
-        links.append([i.a.get('href') for i in search])
-        return links
+def _search_page(provider, query, page):
+    try:
+        return provider.search(query, page)
+    except (SearchBlocked, WebDriverException, requests.exceptions.RequestException) as exc:
+        print(f"search page {page} generated an exception: {exc}")
+        return []
 
 # Generates a list of lists (pages of urls)
 def results(query,n_pages):
-    for page in range(1, n_pages):
-        search_url ='https://www.google.com/search?q='+str(re.sub(r"([^a-zA-Z0-9])", ' ',str(query))).replace(" ", "+")+ "&start=" +str((page - 1) * 10)
-        links=ChromeSocket().g_search(url=search_url)
-    return links
+    # Repeated claims are answered from the cache without touching the search engine
+    pages = search_cache.get(query, n_pages)
+    if pages is not None:
+        return pages
+    provider = get_provider()
+    # Pages are fetched concurrently and returned in page order
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(n_pages, 1)) as executor:
+        pages = list(executor.map(lambda page: _search_page(provider, query, page), range(n_pages)))
+    # Never cache a search that came back empty
+    if any(pages):
+        search_cache.set(query, n_pages, pages)
+    return pages
+
+def stored_metadata(entry):
+    return ArticleMetadata(**entry['metadata']) if entry.get('metadata') else EMPTY_METADATA
+
+def article(url, page, entry):
+    """
+    (stored tokens, paragraph text, metadata) for one url. Exactly one of the
+    first two is set: tokens from a 304 revalidation or the stored copy, text
+    from a fresh fetch that still has to go through the ETL.
+    """
+    if page is not None and page.status == 304 and entry is not None:
+        article_store.revalidated(url, entry)
+        return entry['tokens'], None, stored_metadata(entry)
+    # Fresh hit, or the fetch failed and a stale copy beats an empty article
+    if entry is not None and (page is None or page.status != 200):
+        return entry['tokens'], None, stored_metadata(entry)
+    # Failed fetches and error pages (404, 500, ...) with nothing stored are empty articles
+    if page is None or page.status != 200:
+        return [], None, EMPTY_METADATA
+    # Body text and metadata come out of one pass over the page, which the
+    # fetcher may already have made while streaming the download
+    webtext, metadata = page.article or extract_article(page.text)
+    return None, webtext, metadata
 
-def parse(url, etl):
-    try:
-        soup = ChromeSocket().get_text(url=url)
-        webtext = ''
-        for each in soup.find_all('p'):
-            webtext += ' ' + each.text
-        return [etl(webtext).preprocess()]
-    except requests.exceptions.ReadTimeout:
-        return
-    
 def text(query, etl):
     start_time = time.time()
+    # Articles scraped for earlier queries, straight from the local full-text index
+    indexed = article_index.search(query) if ARTICLE_INDEX_MODE != 'off' else []
+    if ARTICLE_INDEX_MODE == 'skip':
+        # Only hits holding most of the query's tokens answer it, not ones sharing a word with it
+        relevant = [hit for hit in indexed if coverage(query, hit[1]) >= ARTICLE_INDEX_MIN_COVERAGE]
+        if len(relevant) >= ARTICLE_INDEX_MIN_HITS:
+            print(f"Answered from the article index in {time.time() - start_time} seconds")
+            return ([vocabulary.encode(words) for _, words, _ in relevant], [url for url, _, _ in relevant],
+                    [meta for _, _, meta in relevant])
     links = [link for page in results(query=query, n_pages=3) for link in page]
     print(f"Article scraping collection execution time: {time.time() - start_time} seconds")
-    # Use ThreadPoolExecutor to process URLs in parallel
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        # Schedule the execution of fetch_and_process_url for each URL
-        future_to_url = {executor.submit(parse, url=url,etl=etl): url for url in links}
-        # Collect the results as they complete
-        text = []
-        for future in concurrent.futures.as_completed(future_to_url):
-            url = future_to_url[future]
-            try:
-                result = future.result()
-                text.append(result)
-            except Exception as exc:
-                print(f"{url} generated an exception: {exc}")
-                text.append('')
+    entries = [article_store.get(url) for url in links]
+    # Fresh stored articles skip the network, the rest are (conditionally) fetched once each
+    stale = [i for i, entry in enumerate(entries) if entry is None or not article_store.is_fresh(entry)]
+    pages = [None] * len(links)
+    fetched = fetch_all([links[i] for i in stale], headers=[article_store.validators(entries[i]) for i in stale])
+    for i, page in zip(stale, fetched):
+        pages[i] = page
+    # robots.txt disallowed urls are dropped; the fetcher checks only the urls it fetches,
+    # store hits never cost a robots.txt request
+    keep = [i for i, page in enumerate(pages) if page is None or not page.disallowed]
+    if len(keep) < len(links):
+        links, entries, pages = ([seq[i] for i in keep] for seq in (links, entries, pages))
+    print(f"Article fetch execution time: {time.time() - start_time} seconds")
+    tokens = []
+    metadata = []
+    pending = []
+    served = []
+    for i, (url, page, entry) in enumerate(zip(links, pages, entries)):
+        # Failed pages stay as empty articles so text and links line up
+        try:
+            stored, webtext, meta = article(url, page, entry)
+        except Exception as exc:
+            print(f"{url} generated an exception: {exc}")
+            stored, webtext, meta = [], None, EMPTY_METADATA
+        tokens.append(stored)
+        metadata.append(meta)
+        if webtext is not None:
+            pending.append((i, webtext))
+        elif stored:
+            served.append(url)
+    # Articles still served from the store stay in the index, retention is by last use
+    if ARTICLE_INDEX_MODE != 'off':
+        article_index.touch(served)
+    # One batched ETL call for every freshly fetched article of the request
+    for (i, _), words in zip(pending, etl.preprocess_many([webtext for _, webtext in pending])):
+        if is_block_page(words):
+            # Bot wall instead of the article, keep it out of the store and the scores
+            politeness_metrics.incr('block_pages')
+            words, metadata[i] = [], EMPTY_METADATA
+        elif pages[i].status == 200 and words:
+            # Non-html bodies and pages without paragraphs are never stored: a stored
+            # empty article would be served as a fresh hit and never fetched again
+            article_store.put(links[i], pages[i].text, words, pages[i].headers, metadata=metadata[i])
+            if ARTICLE_INDEX_MODE != 'off':
+                article_index.add(links[i], words, metadata[i])
+        tokens[i] = words
+    # merge: indexed articles the live search did not return join the candidates
+    seen = set(links)
+    for url, words, meta in indexed:
+        if url not in seen:
+            links.append(url)
+            tokens.append(words)
+            metadata.append(meta)
+    # Interned once here, downstream stages work on the uint32 id arrays
+    text = [vocabulary.encode(words) for words in tokens]
     print(f"Total execution time: {time.time() - start_time} seconds")
-    return text, links
-
-    '''
-    def text(self):
-        links=[]
-        start_time = time.time()
-        links=([link for page in results(self.query, n_pages=3) for link in page])
-        end_time = time.time()
-        print(f"Execution time: {end_time - start_time} seconds") #23-24s
-        # test here
-        text = [] # Initiate empty list to capture final results
-        for url in links:
-            # For each link, initiate new socket? Not possible google blocks us
-            # HEADLESS SELENIUM OPTIONS
-            try:
-                soup=ChromeSocket(url)[0]
-                webtext = ''
-                for each in soup.find_all('p'):
-                    webtext = webtext + ' ' + each.text
-                text.append([self.etl(webtext).preprocess()])
-            except requests.exceptions.ReadTimeout:
-                text.append('')
-        second_end_time = time.time()
-        print(f"Execution time 2: {second_end_time - start_time} seconds") #220-240s
-        return text, links
-
-    '''
-    # Get the links as well as the titles of each link#
-    def urls(self):
-        url_name = []
-        url_link = []
-        for link in self._encoding.find_all("div", class_="BNeawe s3v9rd AP7Wnd"):
-            url_name.append(link.text)
-            url_link.append(link.get('href'))
-        url_list = list(map(list, zip(*[url_name, url_link])))
-        url_df = pd.DataFrame(url_list)
-        return url_df
-
-    # Get the h1 titles from the page (main title), the h2 titles (contents) and the div title (probably the same as the h1)#
-    def titles(self, h):
-        htext = []
-        '''
-        Titles according to h:
-        '''
-        #h1 title
-        if h == 1:
-            for text in self._encoding.find_all('h1'):
-                #error exception in case there is no title
-                htext.append(text.text)
-        #h2 titles
-        elif h == 2:
-            for text in self._encoding.find_all('h2'):
-                #error exception in case there is no title
-                htext.append(text.text)
-        #div title
-        elif h == 0:
-            #error exception in case there is no title
-            htext = self._encoding.title.string
-        else:
-            raise ValueError('Represents h1 or h2 (gets only 1,2 as values for the headers and 0 for the title)')
-        return htext
-
-    #Get the date of the article (if it exists)
-    def date(self):
-        meta = self._encoding.find_all('meta')
-        published_date = []
-        modified_date = []
-        #meta should be global function
-        '''
-        Many pages use meta tags for dates, authors and keywords. Assuming that the property of the date meta tag, will contain
-        the word 'published' and 'modified' we use it as a leverage to fetch the date.
-        '''
-        for tag in meta:
-            if 'property' in tag.attrs.keys():
-                if tag.attrs['property'].strip().lower().find('published') > 0:
-                    published_date.append(tag.attrs['content'])
-                elif tag.attrs['property'].strip().lower().find('modified') > 0:
-                    modified_date.append(tag.attrs['content'])
-        return published_date, modified_date
-    
-
-    def tags(self):
-        meta = self._encoding.find_all('meta')
-        tag_name = []
-        tag_content = []
-        for tag in meta:
-            if 'name' in tag.attrs.keys() and tag.attrs['name'].strip().lower() in ['description', 'keywords']:
-                tag_name.append(tag.attrs['name'].lower())
-                tag_content.append(tag.attrs['content'])
-        tag_list = list(map(list, zip(*[tag_name, tag_content])))
-        tag_df = pd.DataFrame(tag_list)
-        return tag_df
-
-    def author(self):
-        authordivs = []
-        tags = {tag.name for tag in self._encoding.find_all()}
-        class_list = set()
-        # iterate all tags
-        for tag in tags:
-            # find all elements of tag
-            for i in self._encoding.find_all(tag):
-                # if tag has attribute of class
-                if i.has_attr("class"):
-                    if len(i['class']) != 0:
-                        class_list.add(" ".join(i['class']))
-
-        for i in class_list:
-            if i.find('author') > -1 or i.find('writer') > -1 or i.find('journalist') > -1:
-                authordivs.append(i)
-        authorcontent = []
-        for i in authordivs:
-            try:
-                div = self._encoding.find("div", {"class": i})
-                authorcontent.append(div.text)
-            except AttributeError:
-                pass
-        return authorcontent
-    
+    return text, links, metadata
@@ -0,0 +1,177 @@
+# coding=utf-8
+# Copyright 2022 factual research team.
+#
+import json
+import os
+import sqlite3
+import threading
+import time
+from django.conf import settings
+from bert.metrics import get_metrics
+from bert.parser.extract import ArticleMetadata, EMPTY_METADATA
+
+ARTICLE_INDEX_PATH = getattr(settings, 'ARTICLE_INDEX_PATH', os.path.join(settings.BASE_DIR, '.cache/article_index.sqlite3'))
+# 'off', 'merge' (index hits join the live scrape) or 'skip' (enough index hits replace it)
+ARTICLE_INDEX_MODE = getattr(settings, 'ARTICLE_INDEX_MODE', 'merge')
+ARTICLE_INDEX_LIMIT = getattr(settings, 'ARTICLE_INDEX_LIMIT', 20)
+ARTICLE_INDEX_MIN_HITS = getattr(settings, 'ARTICLE_INDEX_MIN_HITS', 10)
+# Share of the query's distinct tokens a hit must hold to count towards skipping the live search
+ARTICLE_INDEX_MIN_COVERAGE = getattr(settings, 'ARTICLE_INDEX_MIN_COVERAGE', 0.8)
+# Articles older than this are dropped, and the newest max_rows kept
+ARTICLE_INDEX_RETENTION = getattr(settings, 'ARTICLE_INDEX_RETENTION', 30 * 24 * 3600)
+ARTICLE_INDEX_MAX_ROWS = getattr(settings, 'ARTICLE_INDEX_MAX_ROWS', 200000)
+# Retention is applied every this many writes, the FTS optimize runs from compact_article_index
+ARTICLE_INDEX_PRUNE_EVERY = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    url TEXT UNIQUE NOT NULL,
+    indexed_at REAL NOT NULL,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS articles_indexed_at ON articles (indexed_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, body, content='articles', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts(articles_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+END;
+-- Only text changes reach the FTS table, touch() updates indexed_at alone
+CREATE TRIGGER IF NOT EXISTS articles_au AFTER UPDATE OF title, body ON articles BEGIN
+    INSERT INTO articles_fts(articles_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    INSERT INTO articles_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+"""
+
+
+def match_expression(tokens):
+    # Any of the query tokens, each quoted so FTS5 never reads it as syntax
+    tokens = tokens.split() if isinstance(tokens, str) else tokens
+    quoted = ['"{}"'.format(token.replace('"', '""')) for token in dict.fromkeys(tokens) if token]
+    return ' OR '.join(quoted)
+
+
+def coverage(tokens, words):
+    # Share of the distinct query tokens found in an article's tokens; the OR match
+    # also returns articles that only share a word or two with the query
+    tokens = set(tokens.split() if isinstance(tokens, str) else tokens)
+    return len(tokens.intersection(words)) / len(tokens) if tokens else 0.0
+
+
+class ArticleIndex():
+    """
+    SQLite FTS5 full-text index of every scraped article: url, metadata and
+    preprocessed text. Shared by the workers on the node (WAL mode), one
+    connection per thread. Hits are ranked with FTS5's bm25.
+    """
+    def __init__(self, path=ARTICLE_INDEX_PATH, retention=ARTICLE_INDEX_RETENTION, max_rows=ARTICLE_INDEX_MAX_ROWS):
+        self.path = path
+        self.retention = retention
+        self.max_rows = max_rows
+        self.metrics = get_metrics('article_index')
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # Connections are not carried over a fork
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add(self, url, tokens, metadata=None):
+        metadata = metadata or EMPTY_METADATA
+        title = metadata.title or (metadata.h1[0] if metadata.h1 else '')
+        try:
+            self._connection().execute(
+                'INSERT INTO articles (url, indexed_at, title, body, metadata) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(url) DO UPDATE SET indexed_at=excluded.indexed_at, title=excluded.title, '
+                'body=excluded.body, metadata=excluded.metadata',
+                (url, time.time(), title, ' '.join(tokens), json.dumps(metadata._asdict())))
+        except sqlite3.Error as exc:
+            # The index is an accelerator, a locked or broken file never fails a request
+            print(f"Could not index {url}: {exc}")
+            return
+        self.metrics.incr('indexed')
+        self._writes += 1
+        if self._writes % ARTICLE_INDEX_PRUNE_EVERY == 0:
+            self.prune()
+
+    def touch(self, urls):
+        """Marks indexed articles as just seen (served from the store or revalidated), so retention keeps them."""
+        if not urls:
+            return
+        try:
+            self._connection().execute(
+                'UPDATE articles SET indexed_at = ? WHERE url IN ({})'.format(', '.join('?' * len(urls))),
+                (time.time(), *urls))
+        except sqlite3.Error as exc:
+            print(f"Could not touch {len(urls)} indexed articles: {exc}")
+
+    def search(self, tokens, limit=ARTICLE_INDEX_LIMIT):
+        """[(url, tokens, ArticleMetadata)] of the best matching indexed articles."""
+        expression = match_expression(tokens)
+        if not expression:
+            return []
+        start = time.perf_counter()
+        try:
+            rows = self._connection().execute(
+                'SELECT a.url, a.body, a.metadata FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid '
+                'WHERE articles_fts MATCH ? AND a.indexed_at > ? ORDER BY articles_fts.rank LIMIT ?',
+                (expression, time.time() - self.retention, limit)).fetchall()
+        except sqlite3.Error as exc:
+            print(f"Article index search failed: {exc}")
+            return []
+        self.metrics.observe('search_seconds', time.perf_counter() - start)
+        self.metrics.incr('hits', len(rows))
+        return [(url, body.split(), ArticleMetadata(**json.loads(metadata)) if metadata else EMPTY_METADATA)
+                for url, body, metadata in rows]
+
+    def get(self, urls):
+        """[(url, tokens, ArticleMetadata)] of the indexed ones among urls, in their order."""
+        if not urls:
+            return []
+        try:
+            rows = self._connection().execute(
+                'SELECT url, body, metadata FROM articles WHERE url IN ({}) AND indexed_at > ?'.format(
+                    ', '.join('?' * len(urls))), (*urls, time.time() - self.retention)).fetchall()
+        except sqlite3.Error as exc:
+            print(f"Article index lookup failed: {exc}")
+            return []
+        found = {url: (body, metadata) for url, body, metadata in rows}
+        return [(url, found[url][0].split(),
+                 ArticleMetadata(**json.loads(found[url][1])) if found[url][1] else EMPTY_METADATA)
+                for url in urls if url in found]
+
+    def prune(self):
+        """Applies retention: drops expired articles, then all but the newest max_rows."""
+        conn = self._connection()
+        expired = conn.execute('DELETE FROM articles WHERE indexed_at < ?',
+                               (time.time() - self.retention,)).rowcount
+        overflow = conn.execute('DELETE FROM articles WHERE id IN (SELECT id FROM articles '
+                                'ORDER BY indexed_at DESC LIMIT -1 OFFSET ?)', (self.max_rows,)).rowcount
+        self.metrics.incr('pruned', expired + overflow)
+        return expired + overflow
+
+    def compact(self):
+        """Prune, then merge the FTS segments and give the freed pages back to the filesystem."""
+        pruned = self.prune()
+        conn = self._connection()
+        conn.execute("INSERT INTO articles_fts(articles_fts) VALUES ('optimize')")
+        conn.execute('VACUUM')
+        return pruned
+
+
+article_index = ArticleIndex()
@@ -0,0 +1,139 @@
+# coding=utf-8
+# Copyright 2022 factual research team.
+#
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from django.conf import settings
+from bert.metrics import get_metrics
+
+ARTICLE_CACHE_DIR = getattr(settings, 'ARTICLE_CACHE_DIR', os.path.join(settings.BASE_DIR, '.cache/articles'))
+ARTICLE_CACHE_MAX_BYTES = getattr(settings, 'ARTICLE_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+# Younger entries are served with no network I/O, older ones are revalidated
+ARTICLE_CACHE_FRESH = getattr(settings, 'ARTICLE_CACHE_FRESH', 3600)
+# Serve every stored article as is and never revalidate
+ARTICLE_CACHE_OFFLINE = getattr(settings, 'ARTICLE_CACHE_OFFLINE', False)
+
+
+class ArticleStore():
+    """
+    URL-keyed, zlib-compressed store of raw html plus its preprocessed tokens and metadata.
+    Entries keep the ETag/Last-Modified validators so stale ones can be
+    revalidated with a conditional GET. Least recently used files are evicted
+    once the directory grows past max_bytes.
+    """
+    def __init__(self, root=ARTICLE_CACHE_DIR, max_bytes=ARTICLE_CACHE_MAX_BYTES,
+                 fresh_for=ARTICLE_CACHE_FRESH, offline=ARTICLE_CACHE_OFFLINE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fresh_for = fresh_for
+        self.offline = offline
+        self.metrics = get_metrics('article_store')
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _path(self, url):
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def get(self, url):
+        path = self._path(url)
+        try:
+            with open(path, 'rb') as fp:
+                entry = json.loads(zlib.decompress(fp.read()))
+            # mtime doubles as the access time used for eviction; a concurrent
+            # eviction may remove the file in between, which is a miss
+            os.utime(path)
+        except (OSError, ValueError, zlib.error):
+            self.metrics.incr('misses')
+            return None
+        self.metrics.incr('hits')
+        return entry
+
+    def is_fresh(self, entry):
+        return self.offline or time.time() - entry['fetched_at'] < self.fresh_for
+
+    @staticmethod
+    def validators(entry):
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, html, tokens, headers=None, metadata=None):
+        headers = headers or {}
+        entry = {'url': url, 'html': html, 'tokens': tokens, 'fetched_at': time.time(),
+                 'metadata': metadata._asdict() if metadata is not None else None,
+                 'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+        self._write(url, entry)
+
+    def revalidated(self, url, entry):
+        # 304 Not Modified, the stored copy is good for another fresh_for seconds
+        entry['fetched_at'] = time.time()
+        self._write(url, entry)
+        self.metrics.incr('revalidated')
+
+    def _write(self, url, entry):
+        path = self._path(url)
+        blob = zlib.compress(json.dumps(entry).encode('utf-8'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as fp:
+            fp.write(blob)
+        # Atomic so other workers never read a half-written entry
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()[0]
+            self._size += len(blob)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def entries(self):
+        # Every readable entry, for offline jobs; does not count as an access
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith('.tmp'):
+                    continue
+                try:
+                    with open(os.path.join(dirpath, name), 'rb') as fp:
+                        yield json.loads(zlib.decompress(fp.read()))
+                except (OSError, ValueError, zlib.error):
+                    continue
+
+    def _disk_usage(self):
+        files = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, os.path.join(dirpath, name)))
+                total += st.st_size
+        return total, files
+
+    def _evict(self):
+        # Other workers write here too, so recount from disk before deleting
+        total, files = self._disk_usage()
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.metrics.incr('evictions')
+        self._size = total
+
+
+article_store = ArticleStore()
@@ -0,0 +1,101 @@
+# coding=utf-8
+# Copyright 2022 factual research team.
+#
+import atexit
+import queue
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from bert.resources import lazy_import
+
+DRIVER_POOL_SIZE = getattr(settings, 'DRIVER_POOL_SIZE', 2)
+DRIVER_MAX_USES = getattr(settings, 'DRIVER_MAX_USES', 50)
+DRIVER_PAGE_TIMEOUT = getattr(settings, 'DRIVER_PAGE_TIMEOUT', 20)
+
+# Result pages only need the DOM, never styling, images or fonts
+BLOCKED_RESOURCES = ['*.css', '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+                     '*.woff', '*.woff2', '*.ttf', '*.otf']
+
+
+def new_driver():
+    # selenium is only needed once a driver is started
+    webdriver = lazy_import('selenium.webdriver')
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.stylesheets": 2,
+        "profile.managed_default_content_settings.fonts": 2,
+    })
+    driver = webdriver.Chrome(options)
+    driver.set_page_load_timeout(DRIVER_PAGE_TIMEOUT)
+    # Content settings do not cover every css/font request, block them in the network layer too
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_RESOURCES})
+    return driver
+
+
+class DriverPool():
+    """
+    Long-lived headless Chrome drivers handed out one request at a time.
+    A driver is quit and replaced after max_uses requests or when a request using it fails.
+    """
+    def __init__(self, size=DRIVER_POOL_SIZE, max_uses=DRIVER_MAX_USES):
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    @contextmanager
+    def driver(self):
+        self._slots.acquire()
+        try:
+            try:
+                driver, uses = self._idle.get_nowait()
+            except queue.Empty:
+                driver, uses = new_driver(), 0
+            healthy = False
+            try:
+                yield driver
+                healthy = True
+            finally:
+                uses += 1
+                if healthy and uses < self.max_uses and not self._closed:
+                    self._idle.put((driver, uses))
+                else:
+                    self._quit(driver)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            # Crashed drivers may already be gone
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # One pool per worker process, created on first search
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool()
+            atexit.register(_pool.close)
+    return _pool
@@ -0,0 +1,275 @@
+# coding=utf-8
+# Copyright 2022 factual research team.
+#
+import re
+from collections import namedtuple
+from lxml import etree
+from bs4 import BeautifulSoup, NavigableString, Tag
+from django.conf import settings
+try:
+    # Optional C-based parser (lexbor engine)
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+
+# 'lxml' (default), 'selectolax' or 'html5lib' (the old BeautifulSoup path)
+HTML_PARSER = getattr(settings, 'HTML_PARSER', 'lxml')
+
+# Text inside these never belongs to the article, even when nested in a <p>
+SKIP_TAGS = frozenset(['script', 'style', 'noscript', 'template'])
+HEADINGS = frozenset(['title', 'h1', 'h2'])
+# Byline containers, matched on the class attribute
+AUTHOR_TAGS = frozenset(['div', 'span', 'p', 'a', 'address'])
+AUTHOR_CLASS = re.compile(r'author|writer|journalist')
+
+ArticleMetadata = namedtuple('ArticleMetadata', ['title', 'h1', 'h2', 'published', 'modified',
+                                                 'description', 'keywords', 'author'])
+EMPTY_METADATA = ArticleMetadata('', [], [], [], [], '', '', [])
+
+
+class ParagraphTarget():
+    """
+    lxml parser target that keeps only <p> text while the document streams by.
+    No element tree is built and the text is joined once at the end.
+    """
+    def __init__(self):
+        self.parts = []
+        self.chars = 0
+        self.in_p = 0
+        self.skip = 0
+
+    def start(self, tag, attrib):
+        if tag == 'p':
+            self.in_p += 1
+        elif tag in SKIP_TAGS:
+            self.skip += 1
+
+    def end(self, tag):
+        if tag == 'p' and self.in_p:
+            self.in_p -= 1
+            self.parts.append(' ')
+        elif tag in SKIP_TAGS and self.skip:
+            self.skip -= 1
+
+    def data(self, data):
+        if self.in_p and not self.skip:
+            self.parts.append(data)
+            self.chars += len(data)
+
+    def close(self):
+        return ''.join(self.parts)
+
+
+class ArticleTarget(ParagraphTarget):
+    """
+    ParagraphTarget that also fills an ArticleMetadata in the same pass:
+    <title>, h1/h2, published/modified meta properties, description,
+    keywords and the author (meta tag or byline element).
+    """
+    def __init__(self):
+        super().__init__()
+        self.meta = {'title': '', 'h1': [], 'h2': [], 'published': [], 'modified': [],
+                     'description': '', 'keywords': '', 'author': []}
+        # (tag, text parts) of the heading being read
+        self.heading = None
+        # (tag, nesting depth, text parts) of the byline being read
+        self.byline = None
+
+    def start(self, tag, attrib):
+        super().start(tag, attrib)
+        if tag == 'meta':
+            self._meta(attrib)
+        elif tag in HEADINGS and self.heading is None:
+            self.heading = (tag, [])
+        if self.byline is not None:
+            if tag == self.byline[0]:
+                self.byline = (tag, self.byline[1] + 1, self.byline[2])
+        elif tag in AUTHOR_TAGS and AUTHOR_CLASS.search(attrib.get('class') or ''):
+            self.byline = (tag, 1, [])
+
+    def end(self, tag):
+        super().end(tag)
+        if self.heading is not None and tag == self.heading[0]:
+            text = ' '.join(''.join(self.heading[1]).split())
+            if tag == 'title':
+                self.meta['title'] = self.meta['title'] or text
+            elif text:
+                self.meta[tag].append(text)
+            self.heading = None
+        if self.byline is not None and tag == self.byline[0]:
+            if self.byline[1] > 1:
+                self.byline = (tag, self.byline[1] - 1, self.byline[2])
+            else:
+                self._author(''.join(self.byline[2]))
+                self.byline = None
+
+    def data(self, data):
+        super().data(data)
+        if self.skip:
+            return
+        if self.heading is not None:
+            self.heading[1].append(data)
+        if self.byline is not None:
+            self.byline[2].append(data)
+
+    def _meta(self, attrib):
+        content = attrib.get('content')
+        if not content:
+            return
+        prop = (attrib.get('property') or '').strip().lower()
+        name = (attrib.get('name') or '').strip().lower()
+        # e.g. article:published_time / article:modified_time
+        if prop.find('published') > 0:
+            self.meta['published'].append(content)
+        elif prop.find('modified') > 0:
+            self.meta['modified'].append(content)
+        if name in ('description', 'keywords') and not self.meta[name]:
+            self.meta[name] = content
+        if name == 'author' or prop == 'article:author':
+            self._author(content)
+
+    def _author(self, text):
+        text = ' '.join(text.split())
+        if text and text not in self.meta['author']:
+            self.meta['author'].append(text)
+
+    def close(self):
+        return super().close(), ArticleMetadata(**self.meta)
+
+
+def _soup_events(soup, target):
+    # Replays a BeautifulSoup tree as parser target events, iteratively
+    stack = [iter(soup.contents)]
+    names = []
+    while stack:
+        child = next(stack[-1], None)
+        if child is None:
+            stack.pop()
+            if names:
+                target.end(names.pop())
+        elif isinstance(child, Tag):
+            attrib = {k: ' '.join(v) if isinstance(v, list) else v for k, v in child.attrs.items()}
+            target.start(child.name, attrib)
+            names.append(child.name)
+            stack.append(iter(child.contents))
+        elif type(child) is NavigableString:
+            target.data(str(child))
+    return target.close()
+
+
+def _selectolax_events(tree, target):
+    stack = [tree.root.iter(include_text=True)]
+    names = []
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            if names:
+                target.end(names.pop())
+        elif node.tag == '-text':
+            target.data(node.text_content or '')
+        elif node.tag[0] not in '-_!#':
+            target.start(node.tag, node.attributes)
+            names.append(node.tag)
+            stack.append(node.iter(include_text=True))
+    return target.close()
+
+
+def _selectolax_tree(html):
+    if SelectolaxParser is None:
+        raise ImportError("HTML_PARSER='selectolax' needs the selectolax package")
+    return SelectolaxParser(html)
+
+
+class StreamingArticle():
+    """
+    Incremental ArticleTarget parse for downloads: feed() body chunks as they
+    arrive and stop reading once chars of paragraph text have been collected.
+    """
+    def __init__(self, encoding=None):
+        self.target = ArticleTarget()
+        self.parser = etree.HTMLParser(target=self.target, encoding=encoding)
+        self.fed = 0
+
+    def feed(self, chunk):
+        self.fed += len(chunk)
+        self.parser.feed(chunk)
+
+    @property
+    def chars(self):
+        return self.target.chars
+
+    def close(self):
+        # lxml raises on a document without a single element, e.g. an empty body
+        if not self.fed:
+            return '', EMPTY_METADATA
+        try:
+            return self.parser.close()
+        except etree.LxmlError:
+            return self.target.close()
+
+
+def _close(parser, target, html):
+    try:
+        parser.feed(html)
+        return parser.close()
+    except etree.LxmlError:
+        # Whitespace or markup-free bodies: whatever the target collected
+        return target.close()
+
+
+def paragraphs_lxml(html):
+    target = ParagraphTarget()
+    return _close(etree.HTMLParser(target=target), target, html)
+
+
+def paragraphs_selectolax(html):
+    tree = _selectolax_tree(html)
+    for node in tree.css(','.join(SKIP_TAGS)):
+        node.decompose()
+    return ' '.join(node.text(deep=True, separator='') for node in tree.css('p'))
+
+
+def paragraphs_html5lib(html):
+    soup = BeautifulSoup(html, "html5lib")
+    return ' '.join(each.text for each in soup.find_all('p'))
+
+
+def article_lxml(html):
+    target = ArticleTarget()
+    return _close(etree.HTMLParser(target=target), target, html)
+
+
+def article_selectolax(html):
+    return _selectolax_events(_selectolax_tree(html), ArticleTarget())
+
+
+def article_html5lib(html):
+    return _soup_events(BeautifulSoup(html, "html5lib"), ArticleTarget())
+
+
+BACKENDS = {
+    'lxml': paragraphs_lxml,
+    'selectolax': paragraphs_selectolax,
+    'html5lib': paragraphs_html5lib,
+}
+
+ARTICLE_BACKENDS = {
+    'lxml': article_lxml,
+    'selectolax': article_selectolax,
+    'html5lib': article_html5lib,
+}
+
+
+def paragraphs(html, backend=HTML_PARSER):
+    """Concatenated text of every <p> in html."""
+    if not html:
+        return ''
+    return BACKENDS[backend](html)
+
+
+def article(html, backend=HTML_PARSER):
+    """(paragraph text, ArticleMetadata) from a single traversal of html."""
+    if not html:
+        return '', EMPTY_METADATA
+    return ARTICLE_BACKENDS[backend](html)
@@ -0,0 +1,192 @@
+# coding=utf-8
+# Copyright 2022 factual research team.
+#
+import asyncio
+import codecs
+from collections import namedtuple
+from http.cookies import CookieError, Morsel
+import aiohttp
+from yarl import URL
+from django.conf import settings
+from bert.parser.get_user_agent import get_useragent
+from bert.parser.politeness import (HostScheduler, retry_after, needs_rules, load_rules, is_allowed,
+                                    FETCH_MAX_RETRY_AFTER)
+from bert.parser.extract import StreamingArticle, EMPTY_METADATA, HTML_PARSER
+from bert.metrics import get_metrics
+from bert.resources import lazy_import
+
+# Global and per-host bounds on open connections for one text() call
+FETCH_CONCURRENCY = getattr(settings, 'FETCH_CONCURRENCY', 32)
+FETCH_PER_HOST = getattr(settings, 'FETCH_PER_HOST', 4)
+FETCH_TIMEOUT = getattr(settings, 'FETCH_TIMEOUT', 15)
+# Per-article budgets: bytes read off the wire and paragraph characters kept
+ARTICLE_MAX_BYTES = getattr(settings, 'ARTICLE_MAX_BYTES', 2 * 1024 * 1024)
+ARTICLE_MAX_CHARS = getattr(settings, 'ARTICLE_MAX_CHARS', 20000)
+FETCH_CHUNK_SIZE = 64 * 1024
+HTML_TYPES = ('text/html', 'application/xhtml+xml')
+
+# What a single fetch hands back to the parser; article is the (text, metadata)
+# already extracted while streaming, None when the parser still has to run;
+# disallowed urls (robots.txt) were never requested
+Page = namedtuple('Page', ['url', 'status', 'headers', 'text', 'article', 'disallowed'], defaults=(None, False))
+
+metrics = get_metrics('fetcher')
+
+
+def charset(response):
+    # Unknown charsets in the header fall back to sniffing/utf-8
+    if response.charset:
+        try:
+            codecs.lookup(response.charset)
+            return response.charset
+        except LookupError:
+            pass
+    return None
+
+
+def is_html(content_type):
+    # No Content-Type at all is left to the parser
+    return not content_type or content_type.split(';', 1)[0].strip().lower() in HTML_TYPES
+
+
+def load_cookies():
+    # The chrome cookie jar is read from disk, so do it once per fetcher
+    try:
+        # browser_cookie3 pulls in keyring and crypto backends, import it on first use
+        return lazy_import('browser_cookie3').chrome()
+    except Exception as exc:
+        # No usable chrome profile / keyring on this node, fetch without cookies
+        print(f"Could not load chrome cookies: {exc}")
+        return []
+
+
+class AsyncFetcher():
+    """
+    Keep-alive connection pool shared by every url of a text() call.
+    Headers and cookies are loaded once and each url is fetched once,
+    politely: per-host concurrency, spacing and Retry-After back-off.
+    """
+    def __init__(self, concurrency=FETCH_CONCURRENCY, per_host=FETCH_PER_HOST, timeout=FETCH_TIMEOUT):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        # One header profile for the whole session keeps its connections reusable
+        self.header = get_useragent()
+        self.cookies = load_cookies()
+        self.session = None
+        self.scheduler = None
+        # origin -> task loading its robots.txt, shared by the urls of the host
+        self._rules = {}
+
+    async def __aenter__(self):
+        jar = aiohttp.CookieJar(unsafe=True)
+        for cookie in self.cookies:
+            # Each browser cookie keeps its scope: a dotted (domain) cookie also reaches the
+            # subdomains, a host-only one stays on its host, path and secure still apply
+            host = cookie.domain.lstrip('.')
+            morsel = Morsel()
+            try:
+                morsel.set(cookie.name, cookie.value, cookie.value)
+            except CookieError:
+                continue
+            morsel['path'] = cookie.path or '/'
+            morsel['secure'] = bool(cookie.secure)
+            if cookie.domain.startswith('.'):
+                morsel['domain'] = host
+            jar.update_cookies({cookie.name: morsel}, response_url=URL.build(scheme='https', host=host))
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ssl=False)
+        self.session = aiohttp.ClientSession(connector=connector, cookie_jar=jar, trust_env=False,
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout))
+        # Per-host concurrency and spacing, bound to this event loop
+        self.scheduler = HostScheduler(per_host=self.per_host)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def fetch(self, url, headers=None):
+        # headers are per-url extras such as conditional GET validators
+        try:
+            await self._robots(url)
+            if not is_allowed(url):
+                return Page(url, None, {}, '', ('', EMPTY_METADATA), disallowed=True)
+            page = await self._get(url, headers)
+            if page.status in (429, 503):
+                # The host is throttling us: slow the whole host down, then retry once
+                wait = retry_after(page.headers.get('Retry-After'))
+                self.scheduler.back_off(url, wait)
+                if wait <= FETCH_MAX_RETRY_AFTER:
+                    page = await self._get(url, headers)
+            return page
+        except Exception as exc:
+            # One bad page never fails the batch gathered in fetch_all
+            print(f"{url} generated an exception: {exc}")
+            return None
+
+    async def _robots(self, url):
+        # Each host's rules are loaded once, through that host's slot: a slow
+        # robots.txt only holds back the urls of its own host
+        if not needs_rules(url):
+            return
+        origin = URL(url).origin()
+        task = self._rules.get(origin)
+        if task is None:
+            task = self._rules[origin] = asyncio.ensure_future(self._load_rules(url))
+        await task
+
+    async def _load_rules(self, url):
+        async with self.scheduler.slot(url):
+            await load_rules(self.session, url)
+
+    async def _get(self, url, headers=None):
+        async with self.scheduler.slot(url):
+            try:
+                return await self._request(url, headers)
+            except ValueError:
+                # aiohttp rejects malformed header values up front (requests' InvalidHeader)
+                self.header = get_useragent()
+                return await self._request(url, headers)
+
+    async def _request(self, url, headers=None):
+        async with self.session.get(url, headers={**self.header, **(headers or {})}, allow_redirects=False) as r:
+            if r.status != 200:
+                # 304 revalidations, redirects (not followed) and errors: only the status
+                # and headers are used, the body never becomes an article
+                return Page(url, r.status, r.headers, '', ('', EMPTY_METADATA))
+            content_type = r.headers.get('Content-Type')
+            if not is_html(content_type):
+                # PDFs, videos and the like are turned away before the body is read
+                metrics.incr('rejected_type')
+                return Page(url, r.status, r.headers, '', ('', EMPTY_METADATA))
+            # The lxml backend extracts while downloading, so the read can stop early;
+            # bodies without a declared html type are left to extract_article
+            encoding = charset(r)
+            stream = StreamingArticle(encoding=encoding) if HTML_PARSER == 'lxml' and content_type else None
+            body = bytearray()
+            async for chunk in r.content.iter_chunked(FETCH_CHUNK_SIZE):
+                body += chunk
+                if stream is not None:
+                    stream.feed(chunk)
+                    if stream.chars >= ARTICLE_MAX_CHARS:
+                        metrics.incr('stopped_early')
+                        break
+                if len(body) >= ARTICLE_MAX_BYTES:
+                    metrics.incr('truncated')
+                    break
+            metrics.observe('bytes', len(body))
+            html = bytes(body).decode(encoding or 'utf-8', errors='replace')
+            return Page(url, r.status, r.headers, html, stream.close() if stream is not None else None)
+
+    async def fetch_all(self, urls, headers=None):
+        headers = headers or [None] * len(urls)
+        return await asyncio.gather(*(self.fetch(url, h) for url, h in zip(urls, headers)))
+
+
+def fetch_all(urls, headers=None, **kwargs):
+    """Fetch urls concurrently; returns a Page (or None on failure) per url, in order."""
+    if not urls:
+        return []
+    async def _run():
+        async with AsyncFetcher(**kwargs) as fetcher:
+            return await fetcher.fetch_all(urls, headers)
+    return asyncio.run(_run())
@@ -1,17 +1,72 @@
-try:
-    import os
-    import random
-    import io
-    import json
-    from factualweb.settings import BASE_DIR
-except ImportError:
-    pass
+# coding=utf-8
+# Copyright 2022 factual research team.
+#
+import io
+import itertools
+import json
+import os
+import random
+import threading
+from types import MappingProxyType
+from django.conf import settings
+
+# 'weighted' favours current desktop browsers, 'round-robin' cycles through every agent
+USER_AGENT_ROTATION = getattr(settings, 'USER_AGENT_ROTATION', 'weighted')
+USER_AGENT_DATA = os.path.join(settings.BASE_DIR, 'bert/parser/useragent-data.json')
+
+# Agents we never pose as: crawlers, tools and text-only browsers
+EXCLUDED_FOLDERS = ('Spiders', 'Bots', 'Validators', 'Downloaders', 'Libraries', 'Feed Readers',
+                    'Console Browsers', 'Game Consoles', 'WAP', 'Services')
+FIREFOX_ACCEPT = 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
+DEFAULT_ACCEPT = 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8'
+
+
+def header_profile(agent):
+    accept = FIREFOX_ACCEPT if agent.get('browserName') == 'Firefox' else DEFAULT_ACCEPT
+    return MappingProxyType({'User-Agent': agent['userAgent'], 'Accept': accept,
+                             'Accept-Language': 'en-US,en;q=0.9'})
+
+
+def weight(agent):
+    folder = agent.get('folder', '')
+    if folder.startswith('/Browsers - ') and 'Legacy' not in folder:
+        return 4
+    if folder.startswith('/Mobile Devices'):
+        return 2
+    return 1
+
+
+class UserAgentPool():
+    """
+    Immutable header profiles built once from useragent-data.json.
+    next() hands out a copy, so a session can keep its profile for its lifetime.
+    """
+    def __init__(self, agents, rotation=USER_AGENT_ROTATION):
+        agents = [a for a in agents if a.get('userAgent') and not any(f in a.get('folder', '') for f in EXCLUDED_FOLDERS)]
+        self.profiles = tuple(header_profile(a) for a in agents)
+        self.cum_weights = tuple(itertools.accumulate(weight(a) for a in agents))
+        self.rotation = rotation
+        self._cycle = itertools.cycle(self.profiles)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=USER_AGENT_DATA, rotation=USER_AGENT_ROTATION):
+        with io.open(path, encoding='utf-8-sig') as json_data:
+            return cls(json.loads(json_data.read()), rotation)
+
+    def next(self):
+        if self.rotation == 'round-robin':
+            with self._lock:
+                profile = next(self._cycle)
+        else:
+            profile = random.choices(self.profiles, cum_weights=self.cum_weights)[0]
+        return dict(profile)
+
+
+# Loaded once per process, at import
+POOL = UserAgentPool.load()
+
 
 def get_useragent():
     # random select agent (search will be conducted in Google Cloud env, this part doesn't impact our code)
-    # Build paths inside the project like this: BASE_DIR / 'subdir'.
-    PROXIES = os.path.join(BASE_DIR,'bert/parser/useragent-data.json')
-    path_to_json=PROXIES
-    with io.open(path_to_json, encoding='utf-8-sig') as json_data:
-        data = json.loads(json_data.read())
-    return random.choice(data)
\ No newline at end of file
+    return POOL.next()
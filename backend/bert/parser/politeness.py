@@ -0,0 +1,206 @@
+# coding=utf-8
+# Copyright 2022 factual research team.
+#
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import aiohttp
+from django.conf import settings
+from bert.metrics import get_metrics
+
+FETCH_PER_HOST = getattr(settings, 'FETCH_PER_HOST', 4)
+# Minimum spacing between two requests to the same host, raised by a robots Crawl-delay
+FETCH_HOST_DELAY = getattr(settings, 'FETCH_HOST_DELAY', 0.25)
+FETCH_MAX_CRAWL_DELAY = getattr(settings, 'FETCH_MAX_CRAWL_DELAY', 5)
+# A 429/503 is retried once if the host asks us to wait no longer than this
+FETCH_MAX_RETRY_AFTER = getattr(settings, 'FETCH_MAX_RETRY_AFTER', 5)
+ROBOTS_USER_AGENT = getattr(settings, 'ROBOTS_USER_AGENT', 'factual')
+ROBOTS_TTL = getattr(settings, 'ROBOTS_TTL', 3600)
+ROBOTS_TIMEOUT = getattr(settings, 'ROBOTS_TIMEOUT', 5)
+ROBOTS_CACHE_SIZE = getattr(settings, 'ROBOTS_CACHE_SIZE', 4096)
+# Tokens of the preprocessed cloudflare block page (bert/parser/robots.txt)
+ISALLOWED_TOKENS = frozenset(getattr(settings, 'ISALLOWED_TOKENS', []))
+
+metrics = get_metrics('politeness')
+
+
+def compile_pattern(path):
+    # robots wildcards: '*' is any run of characters, a trailing '$' anchors the end
+    anchored = path.endswith('$')
+    if anchored:
+        path = path[:-1]
+    regex = '.*'.join(re.escape(part) for part in path.split('*'))
+    return re.compile(regex + ('$' if anchored else ''))
+
+
+class RobotsRules():
+    """Allow/Disallow rules of one host, compiled once. The longest matching pattern wins, Allow wins ties."""
+    def __init__(self, rules=(), crawl_delay=None):
+        ordered = sorted(rules, key=lambda rule: (len(rule[0]), rule[1]), reverse=True)
+        self.rules = [(compile_pattern(pattern), allow) for pattern, allow in ordered]
+        self.crawl_delay = crawl_delay
+
+    def allowed(self, path):
+        for regex, allow in self.rules:
+            if regex.match(path):
+                return allow
+        return True
+
+    @classmethod
+    def parse(cls, text, agent=ROBOTS_USER_AGENT):
+        groups = []
+        current = None
+        for line in text.splitlines():
+            line = line.split('#', 1)[0].strip()
+            if ':' not in line:
+                continue
+            field, value = [part.strip() for part in line.split(':', 1)]
+            field = field.lower()
+            if field == 'user-agent':
+                # Consecutive user-agent lines share one group
+                if current is None or current['rules'] or current['delay'] is not None:
+                    current = {'agents': [], 'rules': [], 'delay': None}
+                    groups.append(current)
+                current['agents'].append(value.lower())
+            elif current is None:
+                continue
+            elif field in ('allow', 'disallow'):
+                # An empty Disallow allows everything
+                if value:
+                    current['rules'].append((value, field == 'allow'))
+            elif field == 'crawl-delay':
+                try:
+                    current['delay'] = float(value)
+                except ValueError:
+                    pass
+        agent = agent.lower()
+        chosen = [g for g in groups if any(a != '*' and a in agent for a in g['agents'])]
+        chosen = chosen or [g for g in groups if '*' in g['agents']]
+        delays = [g['delay'] for g in chosen if g['delay'] is not None]
+        return cls([rule for g in chosen for rule in g['rules']], max(delays) if delays else None)
+
+
+ALLOW_ALL = RobotsRules()
+DISALLOW_ALL = RobotsRules([('/', False)])
+
+# origin -> (expires, RobotsRules), shared by every request thread of the worker
+_robots = OrderedDict()
+_robots_lock = threading.Lock()
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _path(url):
+    parts = urlsplit(url)
+    return (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+
+
+def needs_rules(url):
+    # No rules for the host yet, or they expired
+    now = time.time()
+    with _robots_lock:
+        entry = _robots.get(_origin(url))
+    return entry is None or entry[0] < now
+
+
+def is_allowed(url):
+    allow = cached_rules(url).allowed(_path(url))
+    if not allow:
+        metrics.incr('robots_blocked')
+    return allow
+
+
+def cached_rules(url):
+    with _robots_lock:
+        entry = _robots.get(_origin(url))
+    return entry[1] if entry is not None else ALLOW_ALL
+
+
+def _remember(origin, rules, ttl):
+    with _robots_lock:
+        _robots[origin] = (time.time() + ttl, rules)
+        _robots.move_to_end(origin)
+        while len(_robots) > ROBOTS_CACHE_SIZE:
+            _robots.popitem(last=False)
+
+
+async def load_rules(session, url):
+    """Fetches and caches the robots.txt rules of url's host, errors are cached as rules too."""
+    origin = _origin(url)
+    try:
+        async with session.get(origin + '/robots.txt', timeout=aiohttp.ClientTimeout(total=ROBOTS_TIMEOUT)) as r:
+            if r.status >= 500:
+                # Server trouble: stay off the host for a while, as crawlers are expected to
+                _remember(origin, DISALLOW_ALL, ROBOTS_TTL / 12)
+            elif r.status >= 400:
+                _remember(origin, ALLOW_ALL, ROBOTS_TTL)
+            else:
+                _remember(origin, RobotsRules.parse(await r.text(errors='replace')), ROBOTS_TTL)
+        metrics.incr('robots_fetched')
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        # Unreachable now, the article fetch will fail on its own; retry the rules soon
+        _remember(origin, ALLOW_ALL, ROBOTS_TTL / 12)
+
+
+def is_block_page(tokens):
+    # A short page made mostly of the block page's words is a bot wall, not an article
+    if not ISALLOWED_TOKENS or not tokens or len(tokens) > 4 * len(ISALLOWED_TOKENS):
+        return False
+    return len(ISALLOWED_TOKENS.intersection(tokens)) >= len(ISALLOWED_TOKENS) / 2
+
+
+def retry_after(value, default=1.0):
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+class HostScheduler():
+    """
+    Per-host concurrency and request spacing for one event loop.
+    A slow or throttling host only delays its own urls, never the whole batch.
+    """
+    def __init__(self, per_host=FETCH_PER_HOST, delay=FETCH_HOST_DELAY):
+        self.per_host = per_host
+        self.delay = delay
+        self._slots = {}
+        self._next = {}
+
+    def _spacing(self, url):
+        crawl_delay = cached_rules(url).crawl_delay or 0
+        return max(self.delay, min(crawl_delay, FETCH_MAX_CRAWL_DELAY))
+
+    @asynccontextmanager
+    async def slot(self, url):
+        host = urlsplit(url).netloc
+        semaphore = self._slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            # Reserve the next start time for this host before sleeping
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + self._spacing(url)
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+    def back_off(self, url, wait):
+        host = urlsplit(url).netloc
+        until = asyncio.get_running_loop().time() + wait
+        self._next[host] = max(self._next.get(host, 0), until)
+        metrics.incr('throttled')
@@ -0,0 +1,119 @@
+# coding=utf-8
+# Copyright 2022 factual research team.
+#
+import re
+from urllib.parse import urlsplit, parse_qs
+import lxml.html
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.utils.module_loading import import_string
+from bert.parser.driver_pool import get_pool
+from bert.parser.get_user_agent import get_useragent
+
+# 'fallback', 'http', 'selenium' or a dotted path to a SearchProvider subclass
+SEARCH_PROVIDER = getattr(settings, 'SEARCH_PROVIDER', 'fallback')
+# Point this at a local stand-in server to search without google
+SEARCH_BASE_URL = getattr(settings, 'SEARCH_BASE_URL', 'https://www.google.com/search')
+SEARCH_TIMEOUT = getattr(settings, 'SEARCH_TIMEOUT', 10)
+
+# Markers of google's "unusual traffic" interstitial
+CHALLENGE_MARKERS = ('/sorry/', 'captcha-form', 'g-recaptcha', 'unusual traffic')
+
+
+class SearchBlocked(Exception):
+    """The search engine answered with a challenge page instead of results."""
+
+
+def search_url(query, page, base_url=SEARCH_BASE_URL):
+    return base_url+'?q='+str(re.sub(r"([^a-zA-Z0-9])", ' ',str(query))).replace(" ", "+")+ "&start=" +str(page * 10)
+
+
+def parse_links(html):
+    # Rendered results keep the target in div.yuRUbf > a, the plain html page wraps it in /url?q=
+    root = lxml.html.fromstring(html)
+    hrefs = [href for div in root.xpath('//div[contains(concat(" ", normalize-space(@class), " "), " yuRUbf ")]')
+             for href in div.xpath('(.//a/@href)[1]')]
+    if not hrefs:
+        hrefs = [parse_qs(urlsplit(href).query).get('q', [''])[0] for href in root.xpath('//a[starts-with(@href, "/url?")]/@href')]
+    links = []
+    for href in hrefs:
+        if href.startswith('http') and 'google.' not in urlsplit(href).netloc and href not in links:
+            links.append(href)
+    return links
+
+
+class SearchProvider():
+    """
+    Source of result links for one page of a query.
+    Subclasses implement links(url); search() builds the url for them.
+    """
+    def __init__(self, base_url=SEARCH_BASE_URL):
+        self.base_url = base_url
+
+    def search(self, query, page):
+        return self.links(search_url(query, page, base_url=self.base_url))
+
+    def links(self, url):
+        raise NotImplementedError
+
+
+class SeleniumSearchProvider(SearchProvider):
+    def links(self, url):
+        # Borrow a warm headless driver instead of launching chrome per page
+        with get_pool().driver() as driver:
+            driver.get(url)
+            page_source = driver.page_source
+        return parse_links(page_source)
+
+
+class HttpSearchProvider(SearchProvider):
+    """Browser-free results: pooled keep-alive http plus an lxml parse of the links."""
+    def __init__(self, base_url=SEARCH_BASE_URL, timeout=SEARCH_TIMEOUT):
+        super().__init__(base_url)
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.trust_env = False
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=10))
+        self.session.mount('http://', HTTPAdapter(pool_maxsize=10))
+        self.session.headers.update(get_useragent())
+
+    def links(self, url):
+        r = self.session.get(url, timeout=self.timeout)
+        if r.status_code in (429, 503) or any(marker in r.url or marker in r.text for marker in CHALLENGE_MARKERS):
+            raise SearchBlocked(url)
+        r.raise_for_status()
+        return parse_links(r.text)
+
+
+class FallbackSearchProvider(SearchProvider):
+    """Try the fast provider first, use the fallback only on a challenge page or no links."""
+    def __init__(self, primary, fallback):
+        super().__init__(primary.base_url)
+        self.primary = primary
+        self.fallback = fallback
+
+    def links(self, url):
+        try:
+            links = self.primary.links(url)
+        except (SearchBlocked, requests.exceptions.RequestException) as exc:
+            print(f"{url} fast search failed, falling back: {exc}")
+            links = []
+        return links or self.fallback.links(url)
+
+
+_provider = None
+
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        if SEARCH_PROVIDER == 'fallback':
+            _provider = FallbackSearchProvider(HttpSearchProvider(), SeleniumSearchProvider())
+        elif SEARCH_PROVIDER == 'http':
+            _provider = HttpSearchProvider()
+        elif SEARCH_PROVIDER == 'selenium':
+            _provider = SeleniumSearchProvider()
+        else:
+            _provider = import_string(SEARCH_PROVIDER)()
+    return _provider
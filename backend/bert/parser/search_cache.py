@@ -0,0 +1,78 @@
+# coding=utf-8
+# Copyright 2022 factual research team.
+#
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from bert.metrics import get_metrics
+
+SEARCH_CACHE_TTL = getattr(settings, 'SEARCH_CACHE_TTL', 900)
+SEARCH_CACHE_SIZE = getattr(settings, 'SEARCH_CACHE_SIZE', 512)
+# Django cache alias shared by every worker on the node, None for in-process only
+SEARCH_CACHE_ALIAS = getattr(settings, 'SEARCH_CACHE_ALIAS', 'search')
+
+
+def normalize(query):
+    # query is the etl.preprocess() token list, a raw string falls back to whitespace tokens
+    tokens = query if isinstance(query, (list, tuple)) else str(query).split()
+    return ' '.join(str(token).lower() for token in tokens)
+
+
+class SearchCache():
+    """
+    Result pages per normalized query, with a TTL.
+    An in-process LRU sits in front of a Django cache shared by the gunicorn workers.
+    """
+    def __init__(self, ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_SIZE, alias=SEARCH_CACHE_ALIAS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared = caches[alias] if alias else None
+        self.metrics = get_metrics('search_cache')
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query, n_pages):
+        digest = hashlib.sha1(normalize(query).encode('utf-8')).hexdigest()
+        return f"search:{n_pages}:{digest}"
+
+    def get(self, query, n_pages):
+        key = self.key(query, n_pages)
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._local.move_to_end(key)
+                self.metrics.incr('hits')
+                return entry[1]
+            self._local.pop(key, None)
+        if self.shared is not None:
+            # The shared value carries its expiry, so a copy never outlives the original
+            entry = self.shared.get(key)
+            if entry is not None and entry[0] > time.time():
+                expires, pages = entry
+                self._remember(key, pages, expires)
+                self.metrics.incr('hits')
+                self.metrics.incr('shared_hits')
+                return pages
+        self.metrics.incr('misses')
+        return None
+
+    def set(self, query, n_pages, pages):
+        key = self.key(query, n_pages)
+        expires = time.time() + self.ttl
+        self._remember(key, pages, expires)
+        if self.shared is not None:
+            self.shared.set(key, (expires, pages), timeout=self.ttl)
+
+    def _remember(self, key, pages, expires):
+        with self._lock:
+            self._local[key] = (expires, pages)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+
+search_cache = SearchCache()
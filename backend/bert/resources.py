@@ -0,0 +1,68 @@
+# coding=utf-8
+# Copyright 2022 factual research team.
+#
+import importlib
+import os
+import sys
+import threading
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from bert.metrics import get_metrics
+
+# Bundled at build time (see the Dockerfile), never downloaded at runtime
+NLTK_DATA = getattr(settings, 'NLTK_DATA', os.path.join(settings.BASE_DIR, 'nltk_data'))
+NLTK_RESOURCES = getattr(settings, 'NLTK_RESOURCES', ('tokenizers/punkt', 'corpora/stopwords'))
+# Imported on first use only, listed by the startup_report command
+HEAVY_MODULES = ('tensorflow', 'transformers', 'nltk', 'sklearn', 'pandas', 'selenium.webdriver',
+                 'browser_cookie3')
+
+metrics = get_metrics('imports')
+_lock = threading.Lock()
+_nltk_checked = False
+
+
+class ResourceMissing(ImproperlyConfigured):
+    pass
+
+
+def nltk_hint():
+    return (f"python -m nltk.downloader -d {NLTK_DATA} "
+            + ' '.join(name.split('/')[-1] for name in NLTK_RESOURCES))
+
+
+def missing_nltk_resources():
+    """NLTK_RESOURCES not found in NLTK_DATA (or the usual nltk locations)."""
+    nltk = lazy_import('nltk')
+    if NLTK_DATA not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA)
+    missing = []
+    for name in NLTK_RESOURCES:
+        try:
+            nltk.data.find(name)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+
+def require_nltk():
+    """Fails fast with the install command instead of downloading on an offline node."""
+    global _nltk_checked
+    with _lock:
+        if _nltk_checked:
+            return
+        missing = missing_nltk_resources()
+        if missing:
+            raise ResourceMissing(f"NLTK data {', '.join(missing)} not found in {NLTK_DATA}, "
+                                  f"bundle it with: {nltk_hint()}")
+        _nltk_checked = True
+
+
+def lazy_import(name):
+    # The first import of a heavy module is timed, later calls hit sys.modules
+    if name in sys.modules:
+        return importlib.import_module(name)
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    metrics.observe(name, time.perf_counter() - start)
+    return module
@@ -0,0 +1,87 @@
+# coding=utf-8
+# Copyright 2022 factual research team.
+#
+import threading
+import numpy as np
+from scipy.sparse import csr_matrix
+from django.conf import settings
+from bert.metrics import get_metrics
+
+# Terms past this many map to OOV, so a long-lived worker's vocabulary stays bounded
+VOCABULARY_MAX_TERMS = getattr(settings, 'VOCABULARY_MAX_TERMS', 500000)
+# Reserved id of every term the vocabulary had no room for
+OOV = 0
+EMPTY = np.zeros(0, dtype=np.uint32)
+
+
+class Vocabulary():
+    """
+    Process-wide term <-> uint32 id map. Ids are never reassigned, so arrays
+    encoded by one request stay valid for every later one in the same worker.
+    """
+    def __init__(self, max_terms=VOCABULARY_MAX_TERMS):
+        self.max_terms = max_terms
+        self.ids = {}
+        self.terms = ['']
+        self.metrics = get_metrics('vocabulary')
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def encode(self, tokens):
+        """uint32 id array of tokens, new terms are interned on the way."""
+        if len(tokens) == 0:
+            return EMPTY
+        get = self.ids.get
+        out = [get(token) for token in tokens]
+        if None in out:
+            with self._lock:
+                for i, token in enumerate(tokens):
+                    if out[i] is None:
+                        out[i] = self._add(token)
+        return np.fromiter(out, dtype=np.uint32, count=len(out))
+
+    def _add(self, token):
+        # Another thread may have added it since the unlocked lookup
+        term_id = self.ids.get(token)
+        if term_id is not None:
+            return term_id
+        if len(self.terms) >= self.max_terms:
+            self.metrics.incr('oov')
+            return OOV
+        term_id = len(self.terms)
+        self.ids[token] = term_id
+        self.terms.append(token)
+        return term_id
+
+    def decode(self, ids):
+        terms = self.terms
+        return [terms[i] for i in ids.tolist() if i != OOV]
+
+
+def term_frequencies(docs):
+    """
+    Sparse (len(docs), n) term-count matrix straight from id arrays, with
+    columns for the n terms these docs use only, and those term ids.
+    OOV ids are dropped, they are not one shared term.
+    """
+    if not docs:
+        return csr_matrix((0, 0)), EMPTY
+    docs = [doc[doc != OOV] for doc in docs]
+    terms = np.unique(np.concatenate(docs))
+    indptr = [0]
+    indices = []
+    data = []
+    for doc in docs:
+        ids, counts = np.unique(doc, return_counts=True)
+        indices.append(np.searchsorted(terms, ids))
+        data.append(counts)
+        indptr.append(indptr[-1] + len(ids))
+    matrix = csr_matrix((np.concatenate(data), np.concatenate(indices), indptr),
+                        shape=(len(docs), len(terms)), dtype=np.float64)
+    return matrix, terms
+
+
+# Shared by every request of the worker
+vocabulary = Vocabulary()
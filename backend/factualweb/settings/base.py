@@ -137,7 +137,7 @@ MODEL_API_URL = os.getenv('MODEL_API_URL', 'http://localhost:5000/analyze')
 MODEL_API_KEY = os.getenv('MODEL_API_KEY', '')
 FACTUAL_API_KEY = os.getenv('FACTUAL_API_KEY', '')
 
-# Load robots.txt tokens
+# Load robots.txt tokens (words of a cloudflare block page, used to spot bot walls)
 ISALLOWED_TOKENS = []
 robots_path = os.path.join(BASE_DIR, 'bert/parser/robots.txt')
 if os.path.exists(robots_path):
@@ -147,5 +147,129 @@ if os.path.exists(robots_path):
             if x:
                 ISALLOWED_TOKENS.append(x)
 
+# Article fetching (bert/parser/fetcher.py)
+FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', '32'))
+FETCH_PER_HOST = int(os.getenv('FETCH_PER_HOST', '4'))
+FETCH_TIMEOUT = int(os.getenv('FETCH_TIMEOUT', '15'))
+# Per-article download budget and the paragraph text after which reading stops
+ARTICLE_MAX_BYTES = int(os.getenv('ARTICLE_MAX_KB', '2048')) * 1024
+ARTICLE_MAX_CHARS = int(os.getenv('ARTICLE_MAX_CHARS', '20000'))
+
+# Header profile rotation (bert/parser/get_user_agent.py): 'weighted' or 'round-robin'
+USER_AGENT_ROTATION = os.getenv('USER_AGENT_ROTATION', 'weighted')
+
+# Fetch politeness (bert/parser/politeness.py)
+FETCH_HOST_DELAY = float(os.getenv('FETCH_HOST_DELAY', '0.25'))
+FETCH_MAX_CRAWL_DELAY = float(os.getenv('FETCH_MAX_CRAWL_DELAY', '5'))
+FETCH_MAX_RETRY_AFTER = float(os.getenv('FETCH_MAX_RETRY_AFTER', '5'))
+ROBOTS_USER_AGENT = os.getenv('ROBOTS_USER_AGENT', 'factual')
+ROBOTS_TTL = int(os.getenv('ROBOTS_TTL', '3600'))
+ROBOTS_TIMEOUT = int(os.getenv('ROBOTS_TIMEOUT', '5'))
+
+# Headless chrome pool for search results (bert/parser/driver_pool.py)
+DRIVER_POOL_SIZE = int(os.getenv('DRIVER_POOL_SIZE', '2'))
+DRIVER_MAX_USES = int(os.getenv('DRIVER_MAX_USES', '50'))
+DRIVER_PAGE_TIMEOUT = int(os.getenv('DRIVER_PAGE_TIMEOUT', '20'))
+
+# Search result retrieval (bert/parser/search.py)
+# 'fallback' tries plain http first and uses selenium only when blocked or empty
+SEARCH_PROVIDER = os.getenv('SEARCH_PROVIDER', 'fallback')
+SEARCH_BASE_URL = os.getenv('SEARCH_BASE_URL', 'https://www.google.com/search')
+SEARCH_TIMEOUT = int(os.getenv('SEARCH_TIMEOUT', '10'))
+
+# Search results cache (bert/parser/search_cache.py)
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '900'))
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '512'))
+SEARCH_CACHE_ALIAS = 'search'
+
+# The file cache is shared by every gunicorn worker on the node
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'search': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('SEARCH_CACHE_DIR', os.path.join(BASE_DIR, '.cache/search')),
+        'TIMEOUT': SEARCH_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': SEARCH_CACHE_SIZE * 4},
+    },
+}
+
+# On-disk article cache (bert/parser/article_store.py)
+ARTICLE_CACHE_DIR = os.getenv('ARTICLE_CACHE_DIR', os.path.join(BASE_DIR, '.cache/articles'))
+ARTICLE_CACHE_MAX_BYTES = int(os.getenv('ARTICLE_CACHE_MAX_MB', '512')) * 1024 * 1024
+ARTICLE_CACHE_FRESH = int(os.getenv('ARTICLE_CACHE_FRESH', '3600'))
+ARTICLE_CACHE_OFFLINE = os.getenv('ARTICLE_CACHE_OFFLINE', 'False') == 'True'
+
+# Local full-text index of scraped articles (bert/parser/article_index.py)
+# 'off', 'merge' (index hits join the live scrape) or 'skip' (ARTICLE_INDEX_MIN_HITS
+# index hits answer the query without a live search); in skip mode only hits holding
+# ARTICLE_INDEX_MIN_COVERAGE of the query's distinct tokens count
+ARTICLE_INDEX_MODE = os.getenv('ARTICLE_INDEX_MODE', 'merge')
+ARTICLE_INDEX_PATH = os.getenv('ARTICLE_INDEX_PATH', os.path.join(BASE_DIR, '.cache/article_index.sqlite3'))
+ARTICLE_INDEX_MIN_HITS = int(os.getenv('ARTICLE_INDEX_MIN_HITS', '10'))
+ARTICLE_INDEX_MIN_COVERAGE = float(os.getenv('ARTICLE_INDEX_MIN_COVERAGE', '0.8'))
+ARTICLE_INDEX_RETENTION = int(os.getenv('ARTICLE_INDEX_RETENTION_DAYS', '30')) * 24 * 3600
+ARTICLE_INDEX_MAX_ROWS = int(os.getenv('ARTICLE_INDEX_MAX_ROWS', '200000'))
+
+# Dense nearest-neighbour index of article embeddings (bert/API/dense_index.py), one per
+# model version; the DENSE_INDEX_TOP_K nearest known articles join a query's candidates.
+# Hits are read from the article index: ARTICLE_INDEX_MODE=off turns this off too
+DENSE_INDEX_MODE = os.getenv('DENSE_INDEX_MODE', 'merge')
+DENSE_INDEX_DIR = os.getenv('DENSE_INDEX_DIR', os.path.join(BASE_DIR, '.cache/dense'))
+DENSE_INDEX_TOP_K = int(os.getenv('DENSE_INDEX_TOP_K', '10'))
+DENSE_INDEX_NPROBE = int(os.getenv('DENSE_INDEX_NPROBE', '8'))
+DENSE_INDEX_BUILD_EVERY = int(os.getenv('DENSE_INDEX_BUILD_EVERY', '256'))
+
+# Paragraph extraction backend (bert/parser/extract.py): 'lxml', 'selectolax' or 'html5lib'
+HTML_PARSER = os.getenv('HTML_PARSER', 'lxml')
+
+# Bundled NLTK data (bert/resources.py), checked at startup and never downloaded
+NLTK_DATA = os.getenv('NLTK_DATA', os.path.join(BASE_DIR, 'nltk_data'))
+
+# Interned term vocabulary (bert/vocabulary.py), per worker; later terms map to OOV
+VOCABULARY_MAX_TERMS = int(os.getenv('VOCABULARY_MAX_TERMS', '500000'))
+
+# Sentiment model runtime (bert/API/backends.py): 'keras', or 'tflite'/'onnx' after
+# manage.py export_model --format <backend>
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'keras')
+MODEL_THREADS = int(os.getenv('MODEL_THREADS', '1'))
+
+# Batched sentiment inference (bert/API/tf_in_use.py)
+SENTIMENT_BATCH_SIZE = int(os.getenv('SENTIMENT_BATCH_SIZE', '32'))
+# Long articles: overlapping 128-token windows, pooled with 'mean' or 'attention'
+SENTIMENT_WINDOWS = os.getenv('SENTIMENT_WINDOWS', 'True') == 'True'
+SENTIMENT_STRIDE = int(os.getenv('SENTIMENT_STRIDE', '32'))
+SENTIMENT_MAX_WINDOWS = int(os.getenv('SENTIMENT_MAX_WINDOWS', '8'))
+SENTIMENT_POOLING = os.getenv('SENTIMENT_POOLING', 'mean')
+# BM25 passage pre-ranking (bert/API/passages.py): only the PASSAGE_TOP_K best
+# passages of an article are scored for sentiment, 0 scores whole articles
+PASSAGE_LENGTH = int(os.getenv('PASSAGE_LENGTH', '64'))
+PASSAGE_STRIDE = int(os.getenv('PASSAGE_STRIDE', '48'))
+PASSAGE_TOP_K = int(os.getenv('PASSAGE_TOP_K', '3'))
+# Near-duplicate (syndicated) articles are scored once per SimHash cluster
+# (bert/API/near_duplicates.py) and listed under the representative's Duplicates
+NEAR_DUPLICATES = os.getenv('NEAR_DUPLICATES', 'True') == 'True'
+SIMHASH_MAX_DISTANCE = int(os.getenv('SIMHASH_MAX_DISTANCE', '6'))
+# Micro-batching queue shared by a worker's request threads (bert/API/inference.py);
+# it needs threaded workers (gunicorn --worker-class gthread), with sync workers turn it off
+INFERENCE_BATCHING = os.getenv('INFERENCE_BATCHING', 'True') == 'True'
+INFERENCE_MAX_BATCH = int(os.getenv('INFERENCE_MAX_BATCH', '64'))
+INFERENCE_MAX_WAIT = float(os.getenv('INFERENCE_MAX_WAIT_MS', '10')) / 1000
+# Score cache per (model input, model version) (bert/API/sentiment_cache.py): an
+# in-process LRU of SENTIMENT_CACHE_SIZE in front of a SQLite table shared by the workers
+SENTIMENT_CACHE_SIZE = int(os.getenv('SENTIMENT_CACHE_SIZE', '20000'))
+SENTIMENT_CACHE_TTL = int(os.getenv('SENTIMENT_CACHE_TTL', str(7 * 24 * 3600)))
+SENTIMENT_CACHE_PATH = os.getenv('SENTIMENT_CACHE_PATH', os.path.join(BASE_DIR, '.cache/sentiment.sqlite3'))
+SENTIMENT_CACHE_MAX_ENTRIES = int(os.getenv('SENTIMENT_CACHE_MAX_ENTRIES', '200000'))
+
+# Background-corpus IDF model (bert/API/idf_model.py), built with manage.py build_idf
+IDF_MODEL_DIR = os.getenv('IDF_MODEL_DIR', os.path.join(BASE_DIR, '.cache/idf'))
+
+# ETL process pool (bert/API/etl_pool.py), per gunicorn worker: keep
+# ETL_PROCESSES x workers close to the core count
+ETL_PROCESSES = int(os.getenv('ETL_PROCESSES', str(os.cpu_count() or 1)))
+ETL_CHUNK_SIZE = int(os.getenv('ETL_CHUNK_SIZE', '4'))
+
 # ETL path
 ETL = os.path.join(BASE_DIR, "bert/API/tf_in_use.py")
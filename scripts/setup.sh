@@ -92,7 +92,7 @@ print_info "✓ Python dependencies installed"
 
 # Download NLTK data
 print_info "Downloading NLTK data..."
-python -c "import nltk; nltk.download('punkt', quiet=True); nltk.download('stopwords', quiet=True)"
+python -m nltk.downloader -q -d nltk_data punkt stopwords
 print_info "✓ NLTK data downloaded"
 
 # Run migrations